@@ -0,0 +1,314 @@
+import csv
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from familiarity import FamiliartyModel as Fam
+from graphcache import load_graph_csr
+from main import Pickers, parse_jobs, sample_sets
+from pathpicker import PathPicker
+from shortcutpicker import ShortcutPicker
+
+# benchmarks the familiarity estimators and the pickers on the bundled graphs
+# with fixed seeds, writing a json report (and optionally csv) so runs of
+# different versions can be compared with --compare
+#   estimators  each is called repeats times on one model. every call draws
+#               fresh samples, so the spread of the results is the estimate
+#               variance. vector estimators report the mean variance over
+#               their candidates
+#   pickers     every job picks once per repeat from a freshly built model and
+#               pickers, so the time includes building whatever caches the
+#               picker needs, as on the first budget step of a run. picks
+#               slower than SLOW_PICK (the nx based path pickers, or
+#               betweenness over every shortcut of a large graph) are timed
+#               once only
+# peak memory is measured with tracemalloc (which numpy reports to) on one
+# extra untimed call, since tracing slows python code down
+
+USAGE_MSG = ("Usage: bench [graph ...] [--iters N] [--repeats N] [--seed N] [--set-size N] "
+             "[--workers N] [--jobs SPEC,...] [--no-pickers] [--no-memory] "
+             "[--out FILE] [--csv FILE] [--compare FILE]")
+
+# the repo's own files, wherever bench is run from
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+GRAPHS = {"hi-tech": os.path.join(ROOT, "formattedData", "soc-firm-hi-tech.adjlist"),
+          "highschool": os.path.join(ROOT, "formattedData", "soc-highschool-moreno.adjlist"),
+          "organization": os.path.join(ROOT, "formattedData", "organization_sns_data.adjlist"),
+          "wiki-Vote": os.path.join(ROOT, "formattedData", "soc-wiki-Vote.adjlist"),
+          "congress": os.path.join(ROOT, "formattedData", "congress.adjlist")}
+
+PICKER_JOBS = ["shortcut", "restricted", "path", "recruit"]
+
+DEFAULT_ITERS = 200
+DEFAULT_REPEATS = 5
+DEFAULT_SEED = 0
+NUM_SHORTCUTS = 256  # candidates scored by sigma_optm
+NUM_PATHS = 64  # candidates scored by sigma_optm_paths
+SLOW_PICK = 10  # seconds
+
+# pickers scoring every shortcut against all pairs distances, or running nx
+# per candidate path, take minutes to hours per pick on the larger graphs.
+# they only run there when asked for by name
+SLOW_JOBS = ["shortcut:betweenness", "path:avg_closeness", "path:avg_betweenness"]
+SLOW_JOB_NODES = 200
+
+FIELDS = ["graph", "nodes", "edges", "kind", "bench", "repeats", "iters", "candidates",
+          "time_mean", "time_std", "time_min", "peak_mem", "samples_per_sec",
+          "estimate_mean", "estimate_var"]
+
+
+## measuring
+
+# seconds for each of repeats calls of func and the results they returned
+def time_calls(func, repeats):
+    times = []
+    results = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        results.append(func())
+        times.append(time.perf_counter() - start)
+    return np.array(times), results
+
+# peak bytes allocated during one call of func
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def make_row(graph, kind, name, times, iters=None, candidates=None, estimates=None, peak=None):
+    row = {"graph": graph, "kind": kind, "bench": name, "repeats": len(times),
+           "iters": iters, "candidates": candidates,
+           "time_mean": float(np.mean(times)),
+           "time_std": float(np.std(times, ddof=1)) if len(times) > 1 else None,
+           "time_min": float(np.min(times)), "peak_mem": peak,
+           "samples_per_sec": None, "estimate_mean": None, "estimate_var": None}
+
+    if iters is not None:
+        row["samples_per_sec"] = float(iters / np.mean(times))
+
+    if estimates is not None:
+        estimates = np.array(estimates, dtype=float).reshape(len(times), -1)
+        row["estimate_mean"] = float(np.mean(estimates))
+        if len(times) > 1:
+            row["estimate_var"] = float(np.mean(np.var(estimates, axis=0, ddof=1)))
+
+    return row
+
+
+## benchmarks
+
+# fixed candidates for the vector estimators: shortcuts from the sources to
+# the targets and paths from the path index, both in a seeded random order
+def bench_candidates(model, seed):
+    rng = np.random.default_rng(seed)
+
+    shortcuts = ShortcutPicker(model, restricted=True).non_edges_between_st()
+    order = rng.permutation(len(shortcuts))[:NUM_SHORTCUTS]
+    shortcuts = [shortcuts[i] for i in order]
+
+    paths = PathPicker(model).candidate_paths()
+    order = rng.permutation(len(paths))[:NUM_PATHS]
+    paths = [paths[i] for i in order]
+
+    return shortcuts, paths
+
+def estimator_calls(model, iters, shortcuts, paths):
+    fam_map = lambda: np.array(list(model.get_node_to_source_fam_map(iters).values()))
+    return {"sigma_sampled": (lambda: model.sigma_sampled(iters), None),
+            "sigma_optm": (lambda: model.sigma_optm(shortcuts, iters), len(shortcuts)),
+            "sigma_optm_paths": (lambda: model.sigma_optm_paths(paths, iters), len(paths)),
+            "fam_map": (fam_map, len(model.graph) - len(model.src_set) - len(model.trg_set))}
+
+def bench_estimators(name, graph, csr, src_set, trg_set, iters, repeats, seed, workers, memory):
+    model = Fam(graph, src_set, trg_set, seed=seed, workers=workers, csr=csr)
+    shortcuts, paths = bench_candidates(model, seed)
+
+    rows = []
+    for bench, (func, candidates) in estimator_calls(model, iters, shortcuts, paths).items():
+        func()  # warm up, eg workers and numpy's first calls
+        times, estimates = time_calls(func, repeats)
+        peak = peak_memory(func) if memory else None
+        rows.append(make_row(name, "estimator", bench, times, iters, candidates, estimates, peak))
+        print_row(rows[-1])
+
+    model.close()
+    return rows
+
+def bench_pickers(name, graph, csr, src_set, trg_set, specs, repeats, seed, workers, memory):
+    def fresh():
+        model = Fam(graph, src_set, trg_set, seed=seed, workers=workers, csr=csr)
+        return model, Pickers(model)
+
+    rows = []
+    for job in parse_jobs(specs, fresh()[1]):
+        kind, func_name, hops = job
+
+        spec = f"{kind}:{func_name}"
+        if spec in SLOW_JOBS and spec not in specs and len(graph) > SLOW_JOB_NODES:
+            print(f"  picker    {job_spec(job):28} skipped, name it in --jobs to run it")
+            continue
+
+        def pick(picker):
+            func = getattr(picker, func_name)
+            return func() if hops == None else func(hops)
+
+        # a pick slower than SLOW_PICK is only timed once, without tracing
+        times = []
+        peak = None
+        for _ in range(repeats + memory):
+            if times and times[0] > SLOW_PICK:
+                break
+
+            model, pickers = fresh()
+            picker = pickers[kind]
+            if len(times) < repeats:
+                times.extend(time_calls(lambda: pick(picker), 1)[0])
+            else:
+                peak = peak_memory(lambda: pick(picker))
+            model.close()
+
+        rows.append(make_row(name, "picker", job_spec(job), times, peak=peak))
+        print_row(rows[-1])
+
+    return rows
+
+# the job as it would be given to --jobs or main
+def job_spec(job):
+    kind, name, hops = job
+    return f"{kind}:{name}" if hops == None else f"{kind}:{name}:{hops}"
+
+def bench_graph(name, path, iters, repeats, seed, set_size, workers, specs, memory):
+    graph, csr = load_graph_csr(path, delimiter="\t")
+    src_set, trg_set = sample_sets(graph, set_size, seed)
+    print(f"{name}: {graph}, sets of {len(src_set)}")
+
+    rows = bench_estimators(name, graph, csr, src_set, trg_set, iters, repeats, seed, workers, memory)
+    if specs:
+        rows += bench_pickers(name, graph, csr, src_set, trg_set, specs, repeats, seed, workers, memory)
+
+    for row in rows:
+        row["nodes"] = graph.number_of_nodes()
+        row["edges"] = graph.number_of_edges()
+    return rows
+
+
+## reports
+
+def print_row(row):
+    line = f"  {row['kind']:9} {row['bench']:28} {row['time_mean']:9.4f}s"
+    if row["samples_per_sec"] is not None:
+        line += f" {row['samples_per_sec']:10.1f} samples/s"
+    if row["estimate_var"] is not None:
+        line += f" var {row['estimate_var']:.4g}"
+    if row["peak_mem"] is not None:
+        line += f" peak {row['peak_mem'] / 2 ** 20:.1f}MiB"
+    print(line)
+
+def git_revision():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=ROOT)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, cwd=ROOT)
+    except OSError:
+        return None, None
+    if rev.returncode != 0:
+        return None, None
+    return rev.stdout.strip(), bool(dirty.stdout.strip())
+
+def make_meta(iters, repeats, seed, set_size, workers):
+    commit, dirty = git_revision()
+    return {"commit": commit, "dirty": dirty,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(), "numpy": np.__version__,
+            "machine": platform.machine(), "platform": platform.platform(),
+            "iters": iters, "repeats": repeats, "seed": seed, "set_size": set_size,
+            "workers": workers, "num_shortcuts": NUM_SHORTCUTS, "num_paths": NUM_PATHS}
+
+def write_report(out_file, meta, rows, csv_file=None):
+    with open(out_file, "w") as out:
+        json.dump({"meta": meta, "results": rows}, out, indent=1)
+
+    if csv_file is not None:
+        with open(csv_file, "w", newline="") as out:
+            writer = csv.DictWriter(out, FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+# mean time of each benchmark in both reports as new / old, below 1 is faster
+def compare(old_file, rows):
+    with open(old_file, "r") as f:
+        old = json.load(f)
+
+    old_times = {(row["graph"], row["kind"], row["bench"]): row["time_mean"]
+                 for row in old["results"]}
+
+    print(f"Compared to {old_file} (commit {old['meta'].get('commit')}):")
+    for row in rows:
+        key = (row["graph"], row["kind"], row["bench"])
+        if key in old_times and old_times[key] > 0:
+            print(f"  {row['graph']:12} {row['bench']:28} x{row['time_mean'] / old_times[key]:.2f}")
+
+
+def run(graphs=None, iters=DEFAULT_ITERS, repeats=DEFAULT_REPEATS, seed=DEFAULT_SEED,
+        set_size=None, workers=1, specs=PICKER_JOBS, memory=True,
+        out_file="bench.json", csv_file=None, compare_file=None):
+    if graphs == None:
+        graphs = list(GRAPHS)
+
+    meta = make_meta(iters, repeats, seed, set_size, workers)
+
+    rows = []
+    for graph in graphs:
+        rows += bench_graph(graph, GRAPHS.get(graph, graph), iters, repeats, seed,
+                            set_size, workers, specs, memory)
+
+    write_report(out_file, meta, rows, csv_file)
+    print(f"Wrote {out_file}")
+
+    if compare_file is not None:
+        compare(compare_file, rows)
+
+    return rows
+
+
+if __name__ == "__main__":
+    args = []
+    options = {}
+
+    argv = iter(sys.argv[1:])
+    for arg in argv:
+        if arg == "--no-pickers":
+            options["specs"] = []
+        elif arg == "--no-memory":
+            options["memory"] = False
+        elif arg in ("--jobs", "--out", "--csv", "--compare"):
+            value = next(argv, None)
+            if value == None:
+                print(f"Missing value for {arg}. {USAGE_MSG}")
+                sys.exit()
+            if arg == "--jobs":
+                options["specs"] = value.split(",")
+            else:
+                options[{"--out": "out_file", "--csv": "csv_file",
+                         "--compare": "compare_file"}[arg]] = value
+        elif arg in ("--iters", "--repeats", "--seed", "--set-size", "--workers"):
+            value = next(argv, None)
+            if value == None or not value.isdigit():
+                print(f"Invalid value for {arg}. {USAGE_MSG}")
+                sys.exit()
+            options[arg[2:].replace("-", "_")] = int(value)
+        elif arg.startswith("--"):
+            print(f"Unknown option {arg}. {USAGE_MSG}")
+            sys.exit()
+        else:
+            args.append(arg)
+
+    run(args or None, **options)
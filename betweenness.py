@@ -0,0 +1,106 @@
+import numpy as np
+from csrgraph import gather_rows
+
+
+CI_Z = 1.96  # 95% interval for pivot-sampled estimates
+
+
+# brandes dependencies of source s on every node, ie the share of shortest
+# paths from s that pass through each node. with trg_mask, only paths ending
+# at a target count, as in nx.betweenness_centrality_subset
+def source_dependencies(csr, s, trg_mask=None):
+    n = csr.num_nodes
+    dist = np.full(n, -1, dtype=np.int64)
+    sigma = np.zeros(n)
+    dist[s] = 0
+    sigma[s] = 1
+
+    # shortest path dag, one (parents, children) edge list per level
+    dag = []
+    frontier = np.array([s], dtype=np.int64)
+    while frontier.size:
+        level = len(dag) + 1
+        nbrs = gather_rows(csr.indptr, csr.indices, frontier)
+        parents = np.repeat(frontier, csr.indptr[frontier + 1] - csr.indptr[frontier])
+
+        frontier = np.unique(nbrs[dist[nbrs] < 0])
+        dist[frontier] = level
+
+        on_dag = dist[nbrs] == level
+        parents, children = parents[on_dag], nbrs[on_dag]
+        sigma += np.bincount(children, weights=sigma[parents], minlength=n)
+        dag.append((parents, children))
+
+    delta = np.zeros(n)
+    for parents, children in reversed(dag):
+        ends = 1 if trg_mask is None else trg_mask[children]
+        coeff = (ends + delta[children]) / sigma[children]
+        delta += np.bincount(parents, weights=sigma[parents] * coeff, minlength=n)
+
+    delta[s] = 0
+    return delta
+
+
+# node betweenness for one csr, cached so it is only computed once per graph.
+# global scores are exact or estimated from sampled pivot sources; subset
+# scores keep each source's contribution, so a node joining the sources
+# costs one more pass
+class Betweenness:
+    def __init__(self, csr):
+        self.csr = csr
+        self.global_cache = {}  # pivots -> (scores, ci half-widths)
+        self.subset_trgs = None
+        self.subset_rows = {}  # source -> its dependencies on the targets
+
+    # normalised like nx.betweenness_centrality. with pivots, only that many
+    # sampled sources are used and scaled up, and the returned ci half-widths
+    # bound the sampling error per node; they are zero for exact scores
+    def global_scores(self, pivots=None, rng=None):
+        n = self.csr.num_nodes
+        if pivots != None and pivots >= n:
+            pivots = None
+
+        if pivots not in self.global_cache:
+            if pivots == None:
+                sources = np.arange(n)
+            else:
+                rng = np.random.default_rng() if rng is None else rng
+                sources = np.sort(rng.choice(n, pivots, replace=False))
+
+            scale = 1 / ((n - 1) * (n - 2)) if n > 2 else 1
+            totals = np.zeros((2, n))
+            for s in sources:
+                contribution = source_dependencies(self.csr, s) * n * scale
+                totals += (contribution, contribution ** 2)
+
+            k = len(sources)
+            scores = totals[0] / n if pivots == None else totals[0] / k
+            ci = np.zeros(n)
+            if pivots != None and k > 1:
+                var = np.maximum(totals[1] / k - scores ** 2, 0) * k / (k - 1)
+                ci = CI_Z * np.sqrt(var / k * (n - k) / (n - 1))
+
+            self.global_cache[pivots] = (scores, ci)
+
+        return self.global_cache[pivots]
+
+    # unnormalised like nx.betweenness_centrality_subset
+    def subset_scores(self, src, trgs):
+        trgs = frozenset(int(t) for t in trgs)
+        if trgs != self.subset_trgs:
+            self.subset_trgs = trgs
+            self.subset_rows = {}
+
+        trg_mask = np.zeros(self.csr.num_nodes)
+        trg_mask[list(trgs)] = 1
+
+        scores = np.zeros(self.csr.num_nodes)
+        for s in src:
+            s = int(s)
+            if s not in self.subset_rows:
+                mask = trg_mask.copy()
+                mask[s] = 0
+                self.subset_rows[s] = source_dependencies(self.csr, s, mask)
+            scores += self.subset_rows[s]
+
+        return scores
@@ -0,0 +1,166 @@
+import numpy as np
+from csrgraph import bfs, gather_rows
+
+
+# candidate shortcuts (u, v) with u in us, v in vs and no edge u -> v in the
+# graph, streamed as (k, 2) index arrays so the complement graph is never held
+# in memory. self-pairs are included like the old non_edges lists
+class CandidateSource:
+    CHUNK_PAIRS = 2 ** 20  # pairs generated per chunk, before removing edges
+
+    def __init__(self, csr, us=None, vs=None):
+        self.csr = csr
+        n = csr.num_nodes
+
+        self.us = np.arange(n) if us is None else np.unique(np.asarray(us, dtype=np.int64))
+        self.vs = np.arange(n) if vs is None else np.unique(np.asarray(vs, dtype=np.int64))
+
+        # sorted edge codes u * n + v, for membership tests
+        self.edge_codes = np.unique(csr.src * n + csr.dst)
+
+    ## pruning, each returns a new source over fewer pairs
+
+    # only u that some source can reach; shortcuts out of anything else can
+    # never fire in a cascade
+    def reachable_from(self, sources):
+        reached = bfs(self.csr.indptr, self.csr.indices, sources)
+        return CandidateSource(self.csr, self.us[reached[self.us]], self.vs)
+
+    # only v that can reach some target; shortcuts into anything else never
+    # activate a target
+    def reaching(self, targets):
+        indptr, indices, _ = self.csr.reverse()
+        reaching = bfs(indptr, indices, targets)
+        return CandidateSource(self.csr, self.us, self.vs[reaching[self.vs]])
+
+    # the k candidates with the highest score_u[u] * score_v[v], kept with a
+    # running partial sort over the chunks
+    def top_k(self, score_u, score_v, k):
+        best = np.empty((0, 2), dtype=np.int64)
+        best_scores = np.empty(0)
+
+        for chunk in self.chunks():
+            best = np.concatenate((best, chunk))
+            best_scores = np.concatenate((best_scores, score_u[chunk[:, 0]] * score_v[chunk[:, 1]]))
+
+            if len(best) > k:
+                keep = np.argpartition(-best_scores, k)[:k]
+                keep.sort()
+                best, best_scores = best[keep], best_scores[keep]
+
+        return CandidateArray(self.csr, best)
+
+    ## consuming
+
+    def is_edge(self, us, vs):
+        codes = us * self.csr.num_nodes + vs
+        if len(self.edge_codes) == 0:
+            return np.zeros(len(codes), dtype=bool)
+
+        pos = np.minimum(np.searchsorted(self.edge_codes, codes), len(self.edge_codes) - 1)
+        return self.edge_codes[pos] == codes
+
+    def chunks(self):
+        if len(self.vs) == 0:
+            return
+
+        rows = max(1, self.CHUNK_PAIRS // len(self.vs))
+        for start in range(0, len(self.us), rows):
+            us = np.repeat(self.us[start:start + rows], len(self.vs))
+            vs = np.tile(self.vs, len(us) // len(self.vs))
+
+            missing = ~self.is_edge(us, vs)
+            yield np.stack((us[missing], vs[missing]), axis=1)
+
+    def array(self):
+        return np.concatenate(list(self.chunks()) or [np.empty((0, 2), dtype=np.int64)])
+
+    # every (u, v) pair less the edges among them, without listing the pairs
+    def __len__(self):
+        n = self.csr.num_nodes
+        in_us = np.zeros(n, dtype=bool)
+        in_us[self.us] = True
+        in_vs = np.zeros(n, dtype=bool)
+        in_vs[self.vs] = True
+
+        u, v = np.divmod(self.edge_codes, n)
+        return len(self.us) * len(self.vs) - int((in_us[u] & in_vs[v]).sum())
+
+    # uniformly random candidate by rejection sampling, None if there are none
+    def sample(self, rng, max_tries=1000):
+        if len(self.us) == 0 or len(self.vs) == 0:
+            return None
+
+        for _ in range(max_tries):
+            u, v = rng.choice(self.us), rng.choice(self.vs)
+            if not self.is_edge(np.array([u]), np.array([v]))[0]:
+                return np.array([u, v])
+
+        # nearly complete graph, fall back to listing what's left
+        cands = self.array()
+        return cands[rng.integers(len(cands))] if len(cands) else None
+
+    # best candidate under a scorer mapping a (k, 2) chunk to scores, earliest
+    # candidate first on ties. None if there are no candidates
+    def best(self, scorer):
+        best_pair = None
+        best_score = None
+
+        for chunk in self.chunks():
+            if len(chunk) == 0:
+                continue
+            scores = scorer(chunk)
+            i = np.argmax(scores)
+            if best_score is None or scores[i] > best_score:
+                best_score = scores[i]
+                best_pair = chunk[i]
+
+        return best_pair
+
+    def to_labels(self, pair):
+        return None if pair is None else (self.csr.nodes[pair[0]], self.csr.nodes[pair[1]])
+
+
+# an already materialised candidate list behaving like a CandidateSource
+class CandidateArray(CandidateSource):
+    def __init__(self, csr, pairs):
+        self.csr = csr
+        self.pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+
+    def reachable_from(self, sources):
+        reached = bfs(self.csr.indptr, self.csr.indices, sources)
+        return CandidateArray(self.csr, self.pairs[reached[self.pairs[:, 0]]])
+
+    def reaching(self, targets):
+        indptr, indices, _ = self.csr.reverse()
+        reaching = bfs(indptr, indices, targets)
+        return CandidateArray(self.csr, self.pairs[reaching[self.pairs[:, 1]]])
+
+    def chunks(self):
+        for start in range(0, len(self.pairs), self.CHUNK_PAIRS):
+            yield self.pairs[start:start + self.CHUNK_PAIRS]
+
+    def array(self):
+        return self.pairs
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def sample(self, rng, max_tries=None):
+        return self.pairs[rng.integers(len(self.pairs))] if len(self.pairs) else None
+
+
+# hop distance from the nearest of the sources to every node, -1 if unreachable
+def bfs_levels(csr, sources):
+    levels = np.full(csr.num_nodes, -1, dtype=np.int64)
+    frontier = np.unique(np.asarray(sources, dtype=np.int64))
+    levels[frontier] = 0
+
+    level = 0
+    while frontier.size:
+        level += 1
+        nbrs = gather_rows(csr.indptr, csr.indices, frontier)
+        frontier = np.unique(nbrs[levels[nbrs] < 0])
+        levels[frontier] = level
+
+    return levels
@@ -1,27 +1,136 @@
+import csv
+import itertools
+import os
 import sys
+import numpy as np
+from graphcache import write_cache
 
-if (len(sys.argv) > 1):
-    inp_file = sys.argv[1]
+# converts an edge list in any of the formats below into a tab-separated SNAP
+# style adjlist under ./formattedData, writing the binary graph cache for it
+# in the same pass. input is streamed in chunks of lines, so large files never
+# go through networkx
+#   mtx    Matrix Market coordinate file, % comments then a size line
+#   edges  whitespace separated, % comments, extra columns (weights) ignored
+#   snap   whitespace separated, # comments
+#   csv    comma separated, optional header row, first two columns used
+# nodes are relabelled to dense integers in order of first appearance unless
+# --keep-labels is given. edges are kept as listed, even in symmetric mtx files
 
-stripped_inp = inp_file.split("/")[-1]
+USAGE_MSG = "Usage: convert <input file> [output file] [--format mtx|edges|snap|csv] [--keep-labels]"
+FORMATS = ["mtx", "edges", "snap", "csv"]
+DELIM = "\t"
+CHUNK_LINES = 2 ** 16
 
-# TODO currently only converts xnetwork to snap; generalise it maybe ?
 
-# output file comments
-predata_comments = f"""# Directed edge list for {stripped_inp} in SNAP format
+def detect_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".mtx":
+        return "mtx"
+    if ext == ".edges":
+        return "edges"
+    if ext == ".csv":
+        return "csv"
+
+    # otherwise look at the first line that isn't a comment
+    with open(path, "r", encoding="utf-8-sig") as inp:
+        for line in inp:
+            if line.lstrip("%").startswith("MatrixMarket"):
+                return "mtx"
+            if line.startswith("%"):
+                return "edges"
+            if line.startswith("#") or line.isspace():
+                continue
+            return "csv" if "," in line else "snap"
+
+    return "snap"
+
+
+# (u, v) label pairs from the input, a chunk of up to CHUNK_LINES at a time
+def edge_chunks(path, fmt):
+    with open(path, "r", encoding="utf-8-sig", newline="") as inp:
+        if fmt == "csv":
+            sample = inp.read(4096)
+            inp.seek(0)
+            rows = csv.reader(inp)
+            if sample and csv.Sniffer().has_header(sample):
+                next(rows, None)
+        else:
+            comment = "#" if fmt == "snap" else "%"
+            rows = (line.split() for line in inp if not line.startswith(comment))
+            if fmt == "mtx":
+                next(rows, None)  # rows, columns and entry count
+
+        while True:
+            chunk = [(row[0].strip(), row[1].strip())
+                     for row in itertools.islice(rows, CHUNK_LINES) if len(row) >= 2]
+            if not chunk:
+                break
+            yield chunk
+
+
+def convert(inp_file, out_file, fmt=None, relabel=True):
+    if fmt == None:
+        fmt = detect_format(inp_file)
+
+    index = {}
+    edges = []
+
+    stripped_inp = inp_file.split("/")[-1]
+
+    # output file comments
+    predata_comments = f"""# Directed edge list for {stripped_inp} in SNAP format
 # Taken from {inp_file}
 # Save as tab-separated list of edges
 # FromNodeId\tToNodeId"""
 
-DELIM = " "
+    with open(out_file, "w") as out:
+        print(predata_comments, file=out)
+
+        for chunk in edge_chunks(inp_file, fmt):
+            ids = np.array([(index.setdefault(u, len(index)), index.setdefault(v, len(index)))
+                            for u, v in chunk], dtype=np.int64)
+            edges.append(ids)
+
+            if relabel:
+                lines = [f"{u}{DELIM}{v}" for u, v in ids.tolist()]
+            else:
+                lines = [f"{u}{DELIM}{v}" for u, v in chunk]
+            out.write("\n".join(lines) + "\n")
+
+    nodes = [str(i) for i in range(len(index))] if relabel else list(index)
+    edges = np.concatenate(edges) if edges else np.empty((0, 2), dtype=np.int64)
+
+    # repeated edges are dropped, as when the adjlist itself is parsed
+    _, first = np.unique(edges[:, 0] * max(len(nodes), 1) + edges[:, 1], return_index=True)
+    write_cache(out_file, nodes, edges[np.sort(first)], DELIM)
+
+    return len(nodes), len(first)
+
+
+if __name__ == "__main__":
+    args = []
+    fmt = None
+    relabel = True
+
+    argv = iter(sys.argv[1:])
+    for arg in argv:
+        if arg == "--format":
+            fmt = next(argv, None)
+            if fmt not in FORMATS:
+                print(f"Invalid format. Must be one of {', '.join(FORMATS)}")
+                sys.exit()
+        elif arg == "--keep-labels":
+            relabel = False
+        else:
+            args.append(arg)
+
+    if len(args) < 1:
+        print(f"Not enough arguments. {USAGE_MSG}")
+        sys.exit()
 
-with open(f"./formattedData/{stripped_inp}", "w+") as out:
-    print(predata_comments, file=out)
+    inp_file = args[0]
+    stem = os.path.splitext(inp_file.split("/")[-1])[0]
+    out_file = args[1] if len(args) > 1 else f"./formattedData/{stem}.adjlist"
 
-    with open(inp_file, "r") as inp:
-        line = inp.readline()
-        while line and not str.isspace(line):
-            line_info = line.split(DELIM)
-            print(f"{line_info[0]}\t{line_info[1]}", file=out)
-            line = inp.readline()
-            
\ No newline at end of file
+    num_nodes, num_edges = convert(inp_file, out_file, fmt, relabel)
+    print(f"Wrote {out_file} with {num_nodes} nodes and {num_edges} edges")
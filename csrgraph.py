@@ -0,0 +1,225 @@
+import numpy as np
+
+
+# concatenates the adjacency rows of the given nodes into one array
+def gather_rows(indptr, indices, nodes):
+    return indices[row_offsets(indptr, nodes)]
+
+
+# csr positions of every entry in the given rows, in order
+def row_offsets(indptr, nodes):
+    starts = indptr[nodes]
+    lens = indptr[nodes + 1] - starts
+    total = int(lens.sum())
+
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+
+    return np.repeat(starts - np.cumsum(lens) + lens, lens) + np.arange(total)
+
+
+# builds csr offsets for rows given (unsorted) row ids
+def make_indptr(rows, num_rows):
+    indptr = np.zeros(num_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_rows), out=indptr[1:])
+    return indptr
+
+
+# multi-source bfs over csr arrays; extra is an optional (k, 2) array of edges
+# not held in the csr. returns a bool array of reached nodes
+def bfs(indptr, indices, sources, extra=None):
+    visited = np.zeros(len(indptr) - 1, dtype=bool)
+    frontier = np.unique(np.asarray(sources, dtype=np.int64))
+    visited[frontier] = True
+
+    while frontier.size:
+        nbrs = gather_rows(indptr, indices, frontier)
+        if extra is not None and len(extra):
+            nbrs = np.concatenate((nbrs, extra[np.isin(extra[:, 0], frontier), 1]))
+
+        frontier = np.unique(nbrs[~visited[nbrs]])
+        visited[frontier] = True
+
+    return visited
+
+
+## bit-parallel traversal: up to 64 samples at once, one bit per sample in a
+## uint64 word per node or edge
+
+WORD_BITS = 64
+
+
+# (k, m) bool masks of k <= 64 samples -> (m,) words, bit j from sample j
+def masks_to_words(masks):
+    padded = np.zeros((masks.shape[1], WORD_BITS), dtype=bool)
+    padded[:, :len(masks)] = masks.T
+    return np.packbits(padded, axis=1, bitorder="little").view("<u8").ravel()
+
+
+# (m,) words -> (m, k) bool, the first k sample bits of each word
+def words_to_bits(words, k):
+    bytes_ = np.ascontiguousarray(words, dtype="<u8").view(np.uint8).reshape(-1, 8)
+    return np.unpackbits(bytes_, axis=1, bitorder="little")[:, :k].astype(bool)
+
+
+# reachability for every sample at once: node v gets bit j if sample j's
+# seeds reach it over edges with bit j set. live holds one word per csr
+# position, seeds one word per node. each sweep only follows edges out of
+# nodes that gained bits in the last one
+def bit_reach(indptr, indices, live, seeds):
+    reached = seeds.copy()
+    delta = seeds
+    frontier = np.flatnonzero(seeds)
+
+    while frontier.size:
+        pos = row_offsets(indptr, frontier)
+        parents = np.repeat(frontier, indptr[frontier + 1] - indptr[frontier])
+
+        new = np.zeros_like(reached)
+        np.bitwise_or.at(new, indices[pos], delta[parents] & live[pos])
+        new &= ~reached
+
+        reached |= new
+        delta = new
+        frontier = np.flatnonzero(new)
+
+    return reached
+
+
+# integer-indexed directed graph in compressed sparse row form. edges keep a
+# stable id (their position in src/dst), so masks over the edge array stay
+# valid when edges are appended with extend()
+class CSRGraph:
+    def __init__(self, nodes, src, dst):
+        self.nodes = list(nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+
+        self.src = np.asarray(src, dtype=np.int64)
+        self.dst = np.asarray(dst, dtype=np.int64)
+
+        self.num_nodes = len(self.nodes)
+        self.num_edges = len(self.src)
+
+        # eid maps csr position -> edge id
+        self.eid = np.argsort(self.src, kind="stable")
+        self.rows = self.src[self.eid]
+        self.indices = self.dst[self.eid]
+        self.indptr = make_indptr(self.src, self.num_nodes)
+
+        # transposed arrays, built on first use
+        self._reverse = None
+
+    # (indptr, indices, eid) of the transposed graph
+    def reverse(self):
+        if self._reverse is None:
+            rev_eid = np.argsort(self.dst, kind="stable")
+            self._reverse = (make_indptr(self.dst, self.num_nodes),
+                             self.src[rev_eid], rev_eid)
+        return self._reverse
+
+    @classmethod
+    def from_networkx(cls, graph, base=None):
+        nodes = list(graph.nodes) if base is None else base.nodes
+        index = {node: i for i, node in enumerate(nodes)}
+
+        edges = np.array([(index[u], index[v]) for u, v in graph.edges()],
+                         dtype=np.int64).reshape(-1, 2)
+
+        if base is None or graph.number_of_nodes() != base.num_nodes:
+            return cls(nodes, edges[:, 0], edges[:, 1])
+
+        # keep ids of edges already in base, append the rest
+        codes = edges[:, 0] * base.num_nodes + edges[:, 1]
+        base_codes = base.src * base.num_nodes + base.dst
+        if not np.isin(base_codes, codes).all():
+            return cls(nodes, edges[:, 0], edges[:, 1])
+
+        added = edges[~np.isin(codes, base_codes)]
+        return base if len(added) == 0 else base.extend(added)
+
+    def extend(self, edges):
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        return CSRGraph(self.nodes,
+                        np.concatenate((self.src, edges[:, 0])),
+                        np.concatenate((self.dst, edges[:, 1])))
+
+    def to_index(self, nodes):
+        return np.fromiter((self.index[node] for node in nodes), dtype=np.int64)
+
+    # (k, 2) index array for a list of (u, v) node pairs
+    def edges_to_index(self, edges):
+        return np.array([(self.index[u], self.index[v]) for u, v in edges],
+                        dtype=np.int64).reshape(-1, 2)
+
+    def live_mask(self, rng, prob):
+        return rng.random(self.num_edges) < prob
+
+    def live(self, mask):
+        return LiveGraph(self, mask)
+
+    # nodes that can reach any of the roots, sampling each in-edge's liveness
+    # only when the bfs first looks at it. edges are examined at most once, so
+    # this is distributed exactly like reversing a fully sampled live graph
+    def sample_reverse_reach(self, rng, prob, roots):
+        indptr, indices, _ = self.reverse()
+
+        visited = np.zeros(self.num_nodes, dtype=bool)
+        frontier = np.unique(np.asarray(roots, dtype=np.int64))
+        visited[frontier] = True
+
+        while frontier.size:
+            nbrs = gather_rows(indptr, indices, frontier)
+            nbrs = nbrs[rng.random(len(nbrs)) < prob]
+
+            frontier = np.unique(nbrs[~visited[nbrs]])
+            visited[frontier] = True
+
+        return np.flatnonzero(visited)
+
+
+# subgraph of a CSRGraph holding only the edges set in a boolean edge mask,
+# plus any extra edges added on top
+class LiveGraph:
+    def __init__(self, csr, mask):
+        self.csr = csr
+        self.mask = mask
+
+        keep = mask[csr.eid]
+        self.indices = csr.indices[keep]
+        self.indptr = make_indptr(csr.rows[keep], csr.num_nodes)
+
+        self.extra_edges = []
+
+        # reach results per source set, valid until the edges change
+        self.reach_cache = {}
+
+        # transposed live arrays, built on first use
+        self._reverse = None
+
+    def add_edge(self, u, v):
+        self.extra_edges.append((u, v))
+        self.reach_cache.clear()
+
+    def remove_edge(self, u, v):
+        self.extra_edges.remove((u, v))
+        self.reach_cache.clear()
+
+    # bool array of nodes reachable from any of the source indices, from a
+    # single multi-source bfs. the returned array is shared, don't modify it
+    def reach(self, sources):
+        key = frozenset(int(s) for s in np.atleast_1d(sources))
+        if key not in self.reach_cache:
+            extra = np.array(self.extra_edges, dtype=np.int64).reshape(-1, 2)
+            self.reach_cache[key] = bfs(self.indptr, self.indices, sources, extra)
+        return self.reach_cache[key]
+
+    # bool array of nodes that can reach any of the target indices
+    def reverse_reach(self, targets):
+        if self._reverse is None:
+            indptr, indices, rev_eid = self.csr.reverse()
+            keep = self.mask[rev_eid]
+            self._reverse = (make_indptr(self.csr.dst[rev_eid][keep], self.csr.num_nodes),
+                             indices[keep])
+
+        extra = np.array(self.extra_edges, dtype=np.int64).reshape(-1, 2)[:, ::-1]
+        return bfs(*self._reverse, targets, extra)
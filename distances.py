@@ -0,0 +1,299 @@
+import numpy as np
+from csrgraph import gather_rows
+
+
+UNREACHABLE = 2 ** 20  # sentinel distance, big enough that sums stay unreachable
+CHUNK_ENTRIES = 2 ** 22  # max entries in the temporary arrays of batched scorers
+
+
+# bfs distances from each of the given sources, one row per source
+def source_distances(csr, sources):
+    dist = np.full((len(sources), csr.num_nodes), UNREACHABLE, dtype=np.int32)
+
+    for i, source in enumerate(sources):
+        frontier = np.array([source], dtype=np.int64)
+        dist[i, source] = 0
+        level = 0
+        while frontier.size:
+            level += 1
+            nbrs = gather_rows(csr.indptr, csr.indices, frontier)
+            frontier = np.unique(nbrs[dist[i, nbrs] == UNREACHABLE])
+            dist[i, frontier] = level
+
+    return dist
+
+
+# bfs from every seed at once up to max_hops, over csr arrays (pass the
+# reverse arrays for distances into the seeds). returns flat (seed position,
+# node, distance) arrays for every node each seed reaches, seeds included at
+# distance 0. seeds are done in batches to bound the visited matrix
+def bounded_distances(indptr, indices, seeds, max_hops):
+    seeds = np.asarray(seeds, dtype=np.int64)
+    n = len(indptr) - 1
+    batch = max(1, CHUNK_ENTRIES // max(n, 1))
+
+    rtn = []
+    for start in range(0, len(seeds), batch):
+        rows = np.arange(min(batch, len(seeds) - start))
+        cols = seeds[start:start + batch]
+        visited = np.zeros((len(rows), n), dtype=bool)
+        visited[rows, cols] = True
+        rtn.append((rows + start, cols, np.zeros(len(rows), dtype=np.int64)))
+
+        for level in range(1, max_hops + 1):
+            nbrs = gather_rows(indptr, indices, cols)
+            nbr_rows = np.repeat(rows, indptr[cols + 1] - indptr[cols])
+
+            new = ~visited[nbr_rows, nbrs]
+            codes = np.unique(nbr_rows[new] * n + nbrs[new])
+            if codes.size == 0:
+                break
+
+            rows, cols = codes // n, codes % n
+            visited[rows, cols] = True
+            rtn.append((rows + start, cols, np.full(len(rows), level, dtype=np.int64)))
+
+    if not rtn:
+        return tuple(np.empty(0, dtype=np.int64) for _ in range(3))
+    return tuple(np.concatenate(parts) for parts in zip(*rtn))
+
+
+# position of every node in the order a bfs from each seed discovers it, as
+# nx.single_source_shortest_path_length does: level by level, each level in
+# order of the parents and then their adjacency rows. one row per seed, -1 for
+# nodes further than max_hops
+def discovery_order(indptr, indices, seeds, max_hops):
+    pos = np.full((len(seeds), len(indptr) - 1), -1, dtype=np.int64)
+
+    for i, seed in enumerate(seeds):
+        frontier = np.array([seed], dtype=np.int64)
+        pos[i, seed] = 0
+        found = 1
+
+        for _ in range(max_hops):
+            nbrs = gather_rows(indptr, indices, frontier)
+            nbrs = nbrs[pos[i, nbrs] < 0]
+            _, first = np.unique(nbrs, return_index=True)
+            frontier = nbrs[np.sort(first)]
+            if frontier.size == 0:
+                break
+
+            pos[i, frontier] = np.arange(found, found + len(frontier))
+            found += len(frontier)
+
+    return pos
+
+
+# closeness of u plus closeness of v once each candidate edge (u, v) is added,
+# with closeness as in nx.closeness_centrality (incoming distance, wf
+# improved). dist has one row per node in sources; if that is only a sample
+# of pivots, sums and reach counts are scaled up to estimate the full values.
+# the new edge leaves distances into u unchanged and makes the distance from
+# s into v min(dist[s, v], dist[s, u] + 1)
+def closeness_after_insertion(dist, sources, num_nodes, cands):
+    sources = np.asarray(sources)
+    scores = closeness_from_columns(dist, sources, num_nodes,
+                                    np.arange(num_nodes))[cands[:, 0]]
+
+    chunk = max(1, CHUNK_ENTRIES // max(len(sources), 1))
+    for start in range(0, len(cands), chunk):
+        us = cands[start:start + chunk, 0]
+        vs = cands[start:start + chunk, 1]
+
+        cols = np.minimum(dist[:, vs], dist[:, us] + 1)
+        scores[start:start + chunk] += closeness_from_columns(cols, sources, num_nodes, vs)
+
+    return scores
+
+
+# closeness of each node in nodes, given its column of incoming distances
+def closeness_from_columns(cols, sources, num_nodes, nodes):
+    # a node's distance to itself doesn't count
+    others = sources[:, None] != nodes[None, :]
+    reached = (cols < UNREACHABLE) & others
+
+    scale = (num_nodes - 1) / np.maximum(others.sum(axis=0), 1)
+    reach_count = reached.sum(axis=0) * scale
+    dist_sum = np.where(reached, cols, 0).sum(axis=0) * scale
+
+    closeness = np.zeros(len(nodes))
+    np.divide(reach_count * reach_count, dist_sum * (num_nodes - 1), out=closeness,
+              where=dist_sum > 0)
+    return closeness
+
+
+# all-pairs bfs distances and shortest path counts for a CSRGraph, kept as
+# dense matrices so scores for many candidate shortcuts can be computed from
+# them with array operations. rows are sources, columns targets
+class DistanceTable:
+    UNREACHABLE = UNREACHABLE
+    CHUNK_ENTRIES = CHUNK_ENTRIES
+
+    def __init__(self, csr):
+        self.csr = csr
+        self.num_nodes = csr.num_nodes
+        self.codes = np.unique(csr.src * csr.num_nodes + csr.dst)
+
+        n = self.num_nodes
+        adj = np.zeros((n, n))
+        adj[csr.src, csr.dst] = 1
+
+        self.dist = np.full((n, n), self.UNREACHABLE, dtype=np.int32)
+        self.counts = np.eye(n)
+        np.fill_diagonal(self.dist, 0)
+
+        # level-synchronous bfs from every source at once
+        visited = np.eye(n, dtype=bool)
+        frontier = np.eye(n)
+        level = 0
+        while frontier.any():
+            level += 1
+            frontier = frontier @ adj
+            frontier[visited] = 0
+
+            new = frontier > 0
+            self.dist[new] = level
+            self.counts[new] = frontier[new]
+            visited |= new
+
+    def copy(self):
+        table = DistanceTable.__new__(DistanceTable)
+        table.csr = self.csr
+        table.num_nodes = self.num_nodes
+        table.codes = self.codes
+        table.dist = self.dist.copy()
+        table.counts = self.counts.copy()
+        return table
+
+    # brings the table up to date with csr. edges added since the table was
+    # built are applied incrementally, anything else means a rebuild
+    def sync(self, csr):
+        if csr is self.csr:
+            return self
+
+        if csr.nodes != self.csr.nodes:
+            return DistanceTable(csr)
+
+        codes = np.unique(csr.src * csr.num_nodes + csr.dst)
+        added = np.setdiff1d(codes, self.codes)
+        if len(codes) - len(added) != len(self.codes):
+            return DistanceTable(csr)
+
+        for code in added:
+            self.add_edge(code // self.num_nodes, code % self.num_nodes)
+        self.csr = csr
+        self.codes = codes
+
+        return self
+
+    # paths through a new edge (u, v) from s to t have length
+    # dist[s, u] + 1 + dist[v, t], and their count is counts[s, u] * counts[v, t]
+    # since shortest paths to u or from v never use the edge itself
+    def add_edge(self, u, v):
+        through = self.dist[:, u, None] + 1 + self.dist[None, v, :]
+        through_counts = np.outer(self.counts[:, u], self.counts[v, :])
+
+        shorter = through < self.dist
+        equal = through == self.dist
+
+        self.counts[equal] += through_counts[equal]
+        self.counts[shorter] = through_counts[shorter]
+        self.dist[shorter] = through[shorter]
+
+    # betweenness each candidate (u, v) would have as an edge of the graph,
+    # normalised like nx.edge_betweenness_centrality. cands is a (k, 2) index
+    # array of edges not in the graph
+    def edge_betweenness(self, cands):
+        n = self.num_nodes
+        scores = np.zeros(len(cands))
+        not_self = ~np.eye(n, dtype=bool)
+
+        # group by u, so every chunk shares the source side
+        order = np.argsort(cands[:, 0], kind="stable")
+        bounds = np.flatnonzero(np.diff(cands[order, 0])) + 1
+
+        for group in np.split(order, bounds):
+            u = cands[group[0], 0]
+
+            # only sources that reach u can route through the new edge
+            srcs = np.flatnonzero(self.dist[:, u] < self.UNREACHABLE)
+            dist_su = self.dist[srcs, u]
+            counts_su = self.counts[srcs, u]
+            dist = self.dist[srcs]
+            counts = self.counts[srcs]
+            pair_mask = not_self[srcs]
+
+            chunk = max(1, self.CHUNK_ENTRIES // (max(len(srcs), 1) * n))
+            for start in range(0, len(group), chunk):
+                idx = group[start:start + chunk]
+                vs = cands[idx, 1]
+
+                through = dist_su[None, :, None] + 1 + self.dist[vs, None, :]
+                through_counts = counts_su[None, :, None] * self.counts[vs, None, :]
+
+                # pairs the edge makes strictly shorter go entirely through it,
+                # ties split by path count
+                frac = (through < dist).astype(float)
+                np.divide(through_counts, counts + through_counts, out=frac,
+                          where=through == dist)
+
+                scores[idx] = (frac * pair_mask).sum(axis=(1, 2))
+
+        return scores / (n * (n - 1)) if n > 1 else scores
+
+    def closeness_after_insertion(self, cands):
+        return closeness_after_insertion(self.dist, np.arange(self.num_nodes),
+                                         self.num_nodes, cands)
+
+
+# bfs distances from each source and to each target only, as dense int16
+# rows. rows are added as nodes join the sets and dropped as they leave, and
+# everything is recomputed only when the graph changes
+class SetDistances:
+    UNREACHABLE = np.iinfo(np.int16).max
+
+    def __init__(self, csr):
+        self.csr = csr
+        self.fwd = {}  # source index -> distances from it
+        self.rev = {}  # target index -> distances to it
+        self.src = []
+        self.trgs = []
+
+    def sync(self, csr, src, trgs):
+        if csr is not self.csr:
+            return SetDistances(csr).sync(csr, src, trgs)
+
+        self.src = [int(x) for x in src]
+        self.trgs = [int(x) for x in trgs]
+
+        indptr, indices, _ = csr.reverse()
+        self.fwd = self.update_rows(self.fwd, self.src, csr.indptr, csr.indices)
+        self.rev = self.update_rows(self.rev, self.trgs, indptr, indices)
+
+        return self
+
+    def update_rows(self, rows, seeds, indptr, indices):
+        n = self.csr.num_nodes
+        new = [x for x in seeds if x not in rows]
+        rtn = {x: rows[x] for x in seeds if x in rows}
+
+        if new:
+            dist = np.full((len(new), n), self.UNREACHABLE, dtype=np.int16)
+            pos, nodes, levels = bounded_distances(indptr, indices, new, n)
+            dist[pos, nodes] = levels
+            rtn.update(zip(new, dist))
+
+        return rtn
+
+    # one row per source, in the order the sources were given
+    def from_sources(self):
+        return self.stack(self.fwd, self.src)
+
+    # one row per target, in the order the targets were given
+    def to_targets(self):
+        return self.stack(self.rev, self.trgs)
+
+    def stack(self, rows, seeds):
+        if not seeds:
+            return np.empty((0, self.csr.num_nodes), dtype=np.int16)
+        return np.stack([rows[x] for x in seeds])
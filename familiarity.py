@@ -1,186 +1,852 @@
-import networkx as nx
 import numpy as np
-import random
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from csrgraph import CSRGraph, make_indptr, masks_to_words, words_to_bits, bit_reach, WORD_BITS
+from distances import DistanceTable, SetDistances
+from betweenness import Betweenness
+from samplebank import SampleBank, BankSlice
 
 class CascadingModel:
     LIVE_PROB = 0.1  # default prob that an edge is live for cascade
 
-    def __init__(self, graph, init_nodes=None):
+    # csr is an optional prebuilt CSRGraph of graph with from_networkx's edge
+    # ids, eg from graphcache.load_graph_csr
+    def __init__(self, graph, init_nodes=None, seed=None, csr=None):
         self.graph = graph
         self.init_nodes = init_nodes  # should be a set of nodes
 
+        # every random draw is derived from this, so a fixed seed reproduces runs
+        self.seed_seq = np.random.SeedSequence(seed)
+        self.rng_seed = self.seed_seq.spawn(1)[0]
+        self.rng = np.random.default_rng(self.rng_seed)
+
+        if csr is not None and (csr.num_nodes != graph.number_of_nodes()
+                                or csr.num_edges != graph.number_of_edges()):
+            raise ValueError("csr does not match the graph")
+
+        # integer-indexed copy of the graph, built once and only extended
+        # when edges are added to self.graph
+        self.base_csr = CSRGraph.from_networkx(graph) if csr is None else csr
+        self.csr = self.base_csr
+        self.dist_table = None
+        self.base_dist_table = None  # kept so runs starting over skip the rebuild
+
     def set_init_nodes(self, nodeset):
         self.init_nodes = nodeset
 
+    # csr of the current graph, including shortcuts added since construction
+    def get_csr(self):
+        if self.graph.number_of_edges() != self.csr.num_edges:
+            self.csr = CSRGraph.from_networkx(self.graph, self.base_csr)
+        return self.csr
+
+    # all-pairs distances of the current graph, updated in place as edges are
+    # added rather than recomputed
+    def get_distance_table(self):
+        csr = self.get_csr()
+        if csr is self.base_csr:
+            if self.base_dist_table is None:
+                self.base_dist_table = DistanceTable(csr)
+            if self.dist_table is None or self.dist_table.csr is not csr:
+                self.dist_table = self.base_dist_table.copy()
+        elif self.dist_table is None:
+            self.dist_table = DistanceTable(csr)
+        else:
+            self.dist_table = self.dist_table.sync(csr)
+        return self.dist_table
+
     def cascade(self):
-        final_active_nodes = set()
-
-        G_copy = self.graph.copy()
-        edges_to_remove = []
-        for edge in G_copy.edges():
-            if random.random() > self.LIVE_PROB:
-                edges_to_remove.append(edge)
-
-        for edge in edges_to_remove:
-            u, v = edge
-            G_copy.remove_edge(u, v)
-
-        for node in G_copy.nodes():
-            for seed in self.init_nodes:
-                if nx.has_path(G_copy, seed, node):
-                    final_active_nodes.add(node)
-                    break
+        csr = self.get_csr()
+        live = csr.live(csr.live_mask(self.rng, self.LIVE_PROB))
+
+        reached = live.reach(csr.to_index(self.init_nodes))
  
-        return final_active_nodes
+        return {csr.nodes[i] for i in np.flatnonzero(reached)}
+
+## monte carlo kernels, run in chunks so they can be shipped to worker processes.
+## each takes the csr and live prob first and a chunk's iters and seed last,
+## and returns the sum and sum of squares of its samples stacked in one array.
+## the seed is either a seed sequence or a slice of a model's sample bank
+
+# (live edge mask, uniform draw for picking a seed node, rng) per sample,
+# fresh or read from a sample bank slice
+def chunk_samples(csr, prob, iters, seed):
+    if isinstance(seed, BankSlice):
+        rng = np.random.default_rng(seed.seed)
+        for i in range(iters):
+            yield seed.mask(i), seed.picks[i], rng
+    else:
+        rng = np.random.default_rng(seed)
+        for _ in range(iters):
+            mask = csr.live_mask(rng, prob)
+            yield mask, rng.random(), rng
+
+# (live edge masks, seed pick draws, rng) for up to WORD_BITS samples at a
+# time, for the bit-parallel kernels. masks are (k, edges) in edge id order
+def chunk_batches(csr, prob, iters, seed):
+    if isinstance(seed, BankSlice):
+        rng = np.random.default_rng(seed.seed)
+        for start in range(0, iters, WORD_BITS):
+            bits = seed.bits[start:start + WORD_BITS]
+            masks = np.unpackbits(bits, axis=1, count=seed.num_edges).astype(bool)
+            yield masks, seed.picks[start:start + WORD_BITS], rng
+    else:
+        rng = np.random.default_rng(seed)
+        for start in range(0, iters, WORD_BITS):
+            k = min(WORD_BITS, iters - start)
+            masks = rng.random((k, csr.num_edges)) < prob
+            yield masks, rng.random(k), rng
+
+# one word per node with bit j set on sample j's seed node
+def seed_words(num_nodes, nodes):
+    words = np.zeros(num_nodes, dtype="<u8")
+    np.bitwise_or.at(words, nodes, np.left_shift(np.uint64(1), np.arange(len(nodes), dtype=np.uint64)))
+    return words
+
+# the cascades of a whole batch of samples run together, one bit per sample
+def sampled_chunk(csr, prob, src, trgs, iters, seed):
+    totals = np.zeros(2)
+
+    for masks, picks, _ in chunk_batches(csr, prob, iters, seed):
+        seeds = seed_words(csr.num_nodes, src[(picks * len(src)).astype(np.int64)])
+        reached = bit_reach(csr.indptr, csr.indices, masks_to_words(masks)[csr.eid], seeds)
+
+        active_trgs = words_to_bits(reached[trgs], len(picks)).sum(axis=0)
+        totals += (active_trgs.sum(), (active_trgs ** 2).sum())
+
+    return totals
+
+OPTM_CAND_BLOCK = 2 ** 14  # candidates scored at once, bounds the (cands, samples) arrays
+
+def optm_chunk(csr, prob, src, trgs, cands, iters, seed):
+    sigmas = np.zeros((2, len(cands)))
+    rev_indptr, rev_indices, rev_eid = csr.reverse()
+
+    for masks, picks, rng in chunk_batches(csr, prob, iters, seed):
+        k = len(picks)
+        live = masks_to_words(masks)
+        seeds = seed_words(csr.num_nodes, src[(picks * len(src)).astype(np.int64)])
+        reached = bit_reach(csr.indptr, csr.indices, live[csr.eid], seeds)
+
+        reached_bits = words_to_bits(reached, k)
+        default_active_trgs = reached_bits[trgs].sum(axis=0)
+
+        # number of still inactive targets each node can reach, per sample.
+        # one reverse sweep per target, seeded on the samples it is inactive in
+        gains = np.zeros((csr.num_nodes, k), dtype=np.int64)
+        for trg in trgs:
+            trg_seeds = np.zeros(csr.num_nodes, dtype="<u8")
+            trg_seeds[trg] = ~reached[trg]
+            gains += words_to_bits(bit_reach(rev_indptr, rev_indices, live[rev_eid], trg_seeds), k)
+
+        for start in range(0, len(cands), OPTM_CAND_BLOCK):
+            block = cands[start:start + OPTM_CAND_BLOCK]
+            live_cands = rng.random((k, len(block))) > prob
+            active_trgs = default_active_trgs + (live_cands.T * reached_bits[block[:, 0]]
+                                                 * gains[block[:, 1]])
+            sigmas[0, start:start + len(block)] += active_trgs.sum(axis=1)
+            sigmas[1, start:start + len(block)] += (active_trgs ** 2).sum(axis=1)
+
+    return sigmas
+
+# paths hold only the edges missing from the graph, as (k, 2) index arrays.
+# bit-parallel like optm_chunk, with paths taken OPTM_CAND_BLOCK at a time
+def optm_paths_chunk(csr, prob, src, trgs, paths, iters, seed):
+    sigmas = np.zeros((2, len(paths)))
+    rev_indptr, rev_indices, rev_eid = csr.reverse()
+
+    sizes = np.array([len(path) for path in paths], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+    edges = np.concatenate(list(paths) + [np.empty((0, 2), dtype=np.int64)])
+
+    for masks, picks, rng in chunk_batches(csr, prob, iters, seed):
+        k = len(picks)
+        live = masks_to_words(masks)
+        fwd_live = live[csr.eid]
+        seeds = seed_words(csr.num_nodes, src[(picks * len(src)).astype(np.int64)])
+        reached = bit_reach(csr.indptr, csr.indices, fwd_live, seeds)
+        reached_bits = words_to_bits(reached, k)
+        default_active_trgs = reached_bits[trgs].sum(axis=0)
+
+        # paths missing a single edge are scored like single shortcuts
+        if (sizes == 1).any():
+            gains = np.zeros((csr.num_nodes, k), dtype=np.int64)
+            for trg in trgs:
+                trg_seeds = np.zeros(csr.num_nodes, dtype="<u8")
+                trg_seeds[trg] = ~reached[trg]
+                gains += words_to_bits(bit_reach(rev_indptr, rev_indices, live[rev_eid], trg_seeds), k)
+
+        for start in range(0, len(paths), OPTM_CAND_BLOCK):
+            block = np.arange(start, min(start + OPTM_CAND_BLOCK, len(paths)))
+            offset = starts[start]
+
+            # one word per edge of the block's paths, bit j set if it is live
+            # in sample j
+            live_edges = masks_to_words(rng.random((k, starts[block[-1] + 1] - offset)) > prob)
+
+            single = block[sizes[block] == 1]
+            if len(single):
+                single_edges = edges[starts[single]]
+                single_live = words_to_bits(live_edges[starts[single] - offset], k)
+                active_trgs = default_active_trgs + (single_live * reached_bits[single_edges[:, 0]]
+                                                     * gains[single_edges[:, 1]])
+                sigmas[0, single] += active_trgs.sum(axis=1)
+                sigmas[1, single] += (active_trgs ** 2).sum(axis=1)
+
+            # the rest grow the reached set through their live edges until none
+            # lead anywhere new, at most one sweep per edge. paths missing no
+            # edges score the cascade as it is
+            for i in block[sizes[block] != 1]:
+                path_edges = edges[starts[i]:starts[i + 1]]
+                path_live = live_edges[starts[i] - offset:starts[i + 1] - offset]
+
+                path_reached = reached
+                while True:
+                    grow = path_reached[path_edges[:, 0]] & path_live & ~path_reached[path_edges[:, 1]]
+                    if not grow.any():
+                        break
+
+                    new_seeds = np.zeros(csr.num_nodes, dtype="<u8")
+                    np.bitwise_or.at(new_seeds, path_edges[:, 1], grow)
+                    path_reached = path_reached | bit_reach(csr.indptr, csr.indices, fwd_live, new_seeds)
+
+                active_trgs = words_to_bits(path_reached[trgs], k).sum(axis=0)
+                sigmas[0, i] += active_trgs.sum()
+                sigmas[1, i] += (active_trgs ** 2).sum()
+
+    return sigmas
+
+def fam_map_chunk(csr, prob, src, trgs, strays, iters, seed):
+    fams = np.zeros((2, len(strays)))
+
+    for mask, pick, _ in chunk_samples(csr, prob, iters, seed):
+        live_graph = csr.live(mask)
+
+        # seed for each stray node, picked from the sources plus that node.
+        # one draw serves every stray, since each estimate only needs its own
+        # pick to be uniform
+        pick = int(pick * (len(src) + 1))
+        seeds = strays if pick == len(src) else np.full(len(strays), src[pick])
+
+        for i in range(len(strays)):
+            active_trgs = live_graph.reach([seeds[i]])[trgs].sum()
+            fams[:, i] += (active_trgs, active_trgs ** 2)
+
+    return fams
+
+# csr shared by all tasks in a worker process, sent once when it starts
+worker_csr = None
+
+def init_worker(csr):
+    global worker_csr
+    worker_csr = csr
+
+def run_worker_chunk(kernel, args, iters, seed):
+    return kernel(worker_csr, *args, iters, seed)
+
+# exact expected number of targets reached from a seed picked uniformly from
+# src. explores the cascade one reached node at a time, deciding all of its
+# out-edges at once. a state only keeps nodes that can still reach an
+# unreached target (everything else is pruned, including every processed node
+# since its out-edges are decided), so states are memoised as (frontier,
+# relevant nodes) bitmasks and shared across sources. still exponential in the
+# worst case, so it gives up once more than max_states states are stored
+def exact_active_trgs(csr, prob, src, trgs, max_states):
+    out_nbrs = [set() for _ in range(csr.num_nodes)]
+    in_nbrs = [set() for _ in range(csr.num_nodes)]
+    for u, v in zip(csr.src.tolist(), csr.dst.tolist()):
+        if u != v:
+            out_nbrs[u].add(v)
+            in_nbrs[v].add(u)
+
+    trg_mask = 0
+    for trg in trgs:
+        trg_mask |= 1 << int(trg)
+
+    memo = {}
+
+    # nodes in candidates that can reach a target not yet in the frontier
+    def relevant(frontier, candidates):
+        rel = trg_mask & candidates & ~frontier
+        stack = [y for y in range(csr.num_nodes) if rel >> y & 1]
+        while stack:
+            y = stack.pop()
+            for x in in_nbrs[y]:
+                if candidates >> x & 1 and not rel >> x & 1:
+                    rel |= 1 << x
+                    stack.append(x)
+        return rel
+
+    # expected targets reached from here on, not counting those already reached
+    def expected(frontier, candidates):
+        candidates = relevant(frontier, candidates)
+        frontier &= candidates
+        if not frontier:
+            return 0.0
+
+        key = (frontier, candidates)
+        if key in memo:
+            return memo[key]
+        if len(memo) >= max_states:
+            raise ValueError(f"exact sigma needs more than {max_states} states, "
+                             "use sampling for this graph")
+
+        x = (frontier & -frontier).bit_length() - 1
+        frontier &= ~(1 << x)
+        candidates &= ~(1 << x)
+
+        # every subset of x's live out-edges into new relevant nodes
+        outcomes = [(0, 1.0, 0)]
+        for y in out_nbrs[x]:
+            if not candidates >> y & 1 or frontier >> y & 1:
+                continue
+            gain = trg_mask >> y & 1
+            outcomes = ([(new | 1 << y, pr * prob, g + gain) for new, pr, g in outcomes]
+                        + [(new, pr * (1 - prob), g) for new, pr, g in outcomes])
+
+        total = 0.0
+        for new, pr, g in outcomes:
+            total += pr * (g + expected(frontier | new, candidates))
+
+        memo[key] = total
+        return total
+
+    all_nodes = (1 << csr.num_nodes) - 1
+    total = 0.0
+    for s in src:
+        s = int(s)
+        total += (trg_mask >> s & 1) + expected(1 << s, all_nodes)
+
+    return total / len(src)
+
+# reverse-reachable sketches: each sketch is the set of nodes that reach a
+# random target on a random live graph, so the chance a source reaches a target
+# is proportional to how many sketches contain it
+class RRIndex:
+    def __init__(self, sketches, num_nodes, trg_count):
+        self.num_sketches = len(sketches)
+        self.trg_count = trg_count
+
+        members = np.concatenate(sketches) if sketches else np.empty(0, dtype=np.int64)
+        sketch_ids = np.repeat(np.arange(self.num_sketches),
+                               [len(sketch) for sketch in sketches])
+
+        # inverted index, node -> ids of the sketches containing it
+        order = np.argsort(members, kind="stable")
+        self.node_indptr = make_indptr(members, num_nodes)
+        self.node_sketches = sketch_ids[order]
+
+        self.coverage = np.diff(self.node_indptr)
+
+    def sketches_of(self, node):
+        return self.node_sketches[self.node_indptr[node]:self.node_indptr[node+1]]
+
+    # expected active targets when the seed is picked uniformly from src
+    def sigma(self, src):
+        if self.num_sketches == 0:
+            return 0
+        return self.trg_count * self.coverage[src].sum() / (len(src) * self.num_sketches)
+
+    # sigma for every node, as if that node were added to src
+    def sigma_with(self, src):
+        if self.num_sketches == 0:
+            return np.zeros(len(self.coverage))
+        base = self.coverage[src].sum()
+        return self.trg_count * (base + self.coverage) / ((len(src) + 1) * self.num_sketches)
 
 class FamiliartyModel(CascadingModel):
     DEFAULT_SAMPLING_ITERS = 200
-
-    def __init__(self, graph, src_set, trg_set):
+    DEFAULT_WORKERS = 1
+    CHUNK_ITERS = 64  # iters per task, fixed so results don't depend on workers.
+                      # one bit-parallel sweep for the sampled and optm kernels
+
+    # precision mode: samples are added a round at a time until the confidence
+    # interval half-width is below the requested precision or the budget is hit
+    CI_Z = 1.96  # 95% interval
+    PRECISION_ROUND_ITERS = 100
+    DEFAULT_MAX_ITERS = 5000
+
+    MAX_EXACT_STATES = 250000  # memo limit for sigma_full
+
+    # part of every sigma cache key, bump it whenever the estimators or the
+    # sample bank change what they compute for a given seed. keys from before
+    # it existed count as version 1
+    SIGMA_VERSION = 2
+
+    # successive halving for picking the best of many candidates: iters per
+    # round, with only the best RACE_KEEP of the candidates going on each time
+    RACE_SCHEDULE = (50, 100, 200, 400)
+    RACE_KEEP = 0.25
+    RACE_CHUNK = 2 ** 16  # candidates scored at once in the first round
+
+    # with bank set, every estimate reads its samples from one SampleBank
+    # instead of drawing fresh ones, see samplebank.py. sigma_cache is an
+    # optional SigmaCache, which can be shared between models of one graph.
+    # csr is as for CascadingModel
+    def __init__(self, graph, src_set, trg_set, seed=None, workers=None, bank=False,
+                 sigma_cache=None, csr=None):
         self.src_set = src_set
         self.trg_set = trg_set
 
         self.init_src_set = src_set.copy()
         self.init_trg_set = trg_set.copy()
-        self.init_graph = graph.copy()
 
         # holds graph with only live edges, not important in construction
         self.live_graph = None
 
         # init nodes don't matter at this point, they are set later
-        super().__init__(graph)
+        super().__init__(graph, seed=seed, csr=csr)
 
-    def sigma(self, full=False):
-        return self.sigma_full() if full else self.sigma_sampled()
+        # changes on top of the base graph, newest last: ("edge", u, v) for an
+        # added shortcut and ("src", node) for a recruited source. self.graph
+        # and src_set are edited in place and rolled back by undoing entries,
+        # so nothing is ever copied
+        self.delta_log = []
+        self.delta_edges = []  # index pairs of the logged shortcuts, in order
 
-    def sigma_full(self):
-        pass
+        # csrs for the first k logged shortcuts, kept while they stay a prefix
+        # of the log so returning to a checkpoint reuses its csr and caches
+        self.csr_prefixes = {0: self.base_csr}
 
-    def sigma_sampled(self, iters=None):
+        self.set_dists = None
+        self.betweenness = None
+
+        self.bank = SampleBank(self.seed_seq.spawn(1)[0], self.LIVE_PROB) if bank else None
+
+        self.sigma_cache = sigma_cache
+        self.base_fingerprint = None
+
+        self.workers = self.DEFAULT_WORKERS if workers == None else workers
+        self.pool = None
+        self.pool_csr = None
+
+    def sigma(self, full=False):
+        if self.sigma_cache is None:
+            return self.sigma_full() if full else self.sigma_sampled()
+
+        key = self.sigma_key(full)
+        sigma = self.sigma_cache.get(key)
+        if sigma is None:
+            sigma = float(self.sigma_full() if full else self.sigma_sampled())
+            self.sigma_cache.put(key, sigma)
+        return sigma
+
+    # canonical hash of what a sigma() result depends on: the base graph, the
+    # set of shortcuts on top of it, both node sets and the estimator. banked
+    # estimates also depend on the bank's seed and layout. SIGMA_VERSION
+    # covers how estimates are computed, so results cached before a change
+    # there are never reused
+    def sigma_key(self, full=False):
+        csr = self.get_csr()
+        base = self.base_csr
+
+        if self.base_fingerprint is None:
+            sha = hashlib.sha1()
+            sha.update("\t".join(map(str, base.nodes)).encode())
+            sha.update(np.sort(base.src * base.num_nodes + base.dst).tobytes())
+            self.base_fingerprint = sha.hexdigest()
+
+        # shortcuts keep their edge ids after the base's, otherwise (the graph
+        # was edited some other way) the whole edge set is hashed
+        if any(csr is prefix for prefix in self.csr_prefixes.values()):
+            edges = np.sort(csr.src[base.num_edges:] * base.num_nodes + csr.dst[base.num_edges:])
+        else:
+            edges = np.sort(csr.src * base.num_nodes + csr.dst)
+
+        if full:
+            estimator = ("full", self.MAX_EXACT_STATES)
+        elif self.bank is not None:
+            estimator = ("bank", self.DEFAULT_SAMPLING_ITERS, self.seed_seq.entropy,
+                         SampleBank.ROW_BLOCK, SampleBank.COL_BLOCK)
+        else:
+            estimator = ("sampled", self.DEFAULT_SAMPLING_ITERS)
+
+        sha = hashlib.sha1()
+        sha.update(self.base_fingerprint.encode())
+        sha.update(edges.tobytes())
+        sha.update(np.sort(csr.to_index(self.src_set)).tobytes())
+        sha.update(b"|")
+        sha.update(np.sort(csr.to_index(self.trg_set)).tobytes())
+        sha.update(repr((self.SIGMA_VERSION, estimator, self.LIVE_PROB)).encode())
+        return sha.hexdigest()
+
+    def sigma_full(self, max_states=None):
+        if max_states == None:
+            max_states = self.MAX_EXACT_STATES
+
+        csr = self.get_csr()
+        return exact_active_trgs(csr, self.LIVE_PROB, self.src_idx(csr),
+                                 csr.to_index(self.trg_set), max_states)
+
+    # with precision set, returns (estimate, ci half-width, iters used) instead
+    # of just the estimate. the same holds for the per-candidate scorers below,
+    # where the loop runs until every candidate's interval is tight enough
+    def sigma_sampled(self, iters=None, rr=False, workers=None,
+                      precision=None, max_iters=None):
         if iters == None:
             iters = self.DEFAULT_SAMPLING_ITERS
 
-        total_active_trg = 0
-
-        for _ in range(iters):
-            self.set_init_nodes({random.choice(tuple(self.src_set))})
+        if rr:
+            if precision != None:
+                raise ValueError("precision mode is not supported for rr sampling")
+            csr = self.get_csr()
+            return self.make_rr_index(iters).sigma(csr.to_index(self.src_set))
 
-            final_active_nodes = self.cascade()
-            
-            for node in final_active_nodes:
-                if node in self.trg_set:
-                    total_active_trg += 1
+        csr = self.get_csr()
+        sigma, ci, iters = self.estimate(sampled_chunk, csr,
+                                         (self.src_idx(csr), csr.to_index(self.trg_set)),
+                                         iters, workers, precision, max_iters)
 
-        return total_active_trg / iters
+        return sigma if precision == None else (sigma, ci, iters)
     
-    def sigma_optm(self, shortcuts, iters=None):
+    # start is the first sample bank row read, see race
+    def sigma_optm(self, shortcuts, iters=None, workers=None,
+                   precision=None, max_iters=None, start=0):
         if iters == None:
             iters = self.DEFAULT_SAMPLING_ITERS
 
-        sigmas = np.zeros(len(shortcuts))
+        if len(shortcuts) == 0:
+            return np.zeros(0) if precision == None else (np.zeros(0), np.zeros(0), 0)
 
-        for _ in range(iters):
-            self.set_init_nodes({random.choice(tuple(self.src_set))})
+        csr = self.get_csr()
+        cands = self.shortcut_index(csr, shortcuts)
+
+        sigmas, ci, iters = self.estimate(optm_chunk, csr,
+                                          (self.src_idx(csr), csr.to_index(self.trg_set), cands),
+                                          iters, workers, precision, max_iters, start)
 
-            self.make_live_graph()
-            default_active_trgs = self.get_active_trg_count()
+        return sigmas if precision == None else (sigmas, ci, iters)
 
-            for i in range(len(shortcuts)):
-                if random.random() > self.LIVE_PROB:
-                    u, v = shortcuts[i]
-                    self.live_graph.add_edge(u, v)
-                    sigmas[i] += self.get_active_trg_count()
-                    self.live_graph.remove_edge(u, v)
-                else:
-                    sigmas[i] += default_active_trgs
+    # marginal gain of each shortcut over the current graph. both terms come
+    # from the same live graphs, the baseline via a self-loop which can never
+    # change what is reached
+    def shortcut_gains(self, shortcuts, iters=None, workers=None):
+        node = self.src_idx(self.get_csr())[0]
+        cands = self.shortcut_index(self.get_csr(), shortcuts)
+        sigmas = self.sigma_optm(np.concatenate((cands, [[node, node]])), iters, workers)
+        return sigmas[:-1] - sigmas[-1]
 
-        return np.divide(sigmas, iters)
+    # shortcuts may be given as (u, v) node pairs or as a (k, 2) index array
+    def shortcut_index(self, csr, shortcuts):
+        if isinstance(shortcuts, np.ndarray):
+            return shortcuts.reshape(-1, 2)
+        return csr.edges_to_index(shortcuts)
 
-    def sigma_optm_paths(self, paths, iters=None):
+    def sigma_optm_paths(self, paths, iters=None, workers=None,
+                         precision=None, max_iters=None, start=0):
         if iters == None:
             iters = self.DEFAULT_SAMPLING_ITERS
 
-        sigmas = np.zeros(len(paths))
-
-        for _ in range(iters):
-            self.set_init_nodes({random.choice(tuple(self.src_set))})
-
-            self.make_live_graph()
-            default_active_trgs = self.get_active_trg_count()
+        if len(paths) == 0:
+            return np.zeros(0) if precision == None else (np.zeros(0), np.zeros(0), 0)
 
-            for i in range(len(paths)):
+        csr = self.get_csr()
 
-                live_edges_added = []
-                for shortcut in paths[i]:
-                    u, v = shortcut
-                    if not self.graph.has_edge(u, v) and random.random() > self.LIVE_PROB:
-                        self.live_graph.add_edge(u, v)
-                        live_edges_added.append(shortcut)
+        # only edges not already in the graph are sampled as shortcuts
+        path_idx = []
+        for path in paths:
+            missing = [edge for edge in path if not self.graph.has_edge(*edge)]
+            path_idx.append(csr.edges_to_index(missing))
 
-                sigmas[i] += self.get_active_trg_count()
-                for shortcut in live_edges_added:
-                    u, v = shortcut
-                    self.live_graph.remove_edge(u, v)
+        sigmas, ci, iters = self.estimate(optm_paths_chunk, csr,
+                                          (self.src_idx(csr), csr.to_index(self.trg_set), path_idx),
+                                          iters, workers, precision, max_iters, start)
 
-        return np.divide(sigmas, iters)
+        return sigmas if precision == None else (sigmas, ci, iters)
     
-    def get_node_to_source_fam_map(self, iters=None):
+    # in precision mode the ci is also a dictionary keyed by node
+    def get_node_to_source_fam_map(self, iters=None, rr=False, workers=None,
+                                   precision=None, max_iters=None):
         # will be a dictionary of nodes with associated new familiarity
         rtn = {} 
+        rtn_ci = {}
 
         if iters == None:
             iters = self.DEFAULT_SAMPLING_ITERS
 
-        for _ in range(iters):
-            self.make_live_graph()
+        # score every stray node at once from the same set of sketches
+        if rr:
+            if precision != None:
+                raise ValueError("precision mode is not supported for rr sampling")
+            csr = self.get_csr()
+            fams = self.make_rr_index(iters).sigma_with(csr.to_index(self.src_set))
 
             for node in self.graph.nodes:
-                # look at only stray nodes (ie not in either set already)
                 if node in self.src_set or node in self.trg_set:
                     continue
+                rtn[node] = fams[csr.index[node]]
+
+            return rtn
+
+        csr = self.get_csr()
 
-                # source node set including new node to add/test
-                new_src = self.src_set.copy()
-                new_src.add(node)
-                
-                self.set_init_nodes({random.choice(tuple(new_src))})
+        # look at only stray nodes (ie not in either set already)
+        strays = [node for node in csr.nodes
+                  if node not in self.src_set and node not in self.trg_set]
+        if len(strays) == 0:
+            return rtn if precision == None else (rtn, rtn_ci, 0)
 
-                if node in rtn:
-                    rtn[node] += self.get_active_trg_count()
-                else:
-                    rtn[node] = self.get_active_trg_count()
+        fams, ci, iters = self.estimate(fam_map_chunk, csr,
+                                        (self.src_idx(csr), csr.to_index(self.trg_set),
+                                         csr.to_index(strays)),
+                                        iters, workers, precision, max_iters)
 
-        # normalise by dividing by number of iters
-        for item in rtn:
-            rtn[item] /= iters
+        for i in range(len(strays)):
+            rtn[strays[i]] = float(fams[i])
+            rtn_ci[strays[i]] = float(ci[i])
 
-        return rtn
+        return rtn if precision == None else (rtn, rtn_ci, iters)
     
-    def make_live_graph(self):
-        self.live_graph = self.init_graph.copy()
+    # the best of num_cands candidates by successive halving, None if there are
+    # none. the first round streams the candidates through from chunks, by
+    # default index arrays over range(num_cands), keeping only the survivors.
+    # score maps candidates (rows of what chunks yields), iters and a first
+    # sample bank row to estimates, and estimates from every round a
+    # candidate survived are pooled, weighted by iters. each round starts at
+    # the row the last one stopped at, so pooled rounds never count a banked
+    # sample twice
+    def race(self, score, num_cands, schedule=None, keep=None, chunks=None):
+        if schedule == None:
+            schedule = self.RACE_SCHEDULE
+        if keep == None:
+            keep = self.RACE_KEEP
+        if chunks == None:
+            chunks = (np.arange(start, min(start + self.RACE_CHUNK, num_cands))
+                      for start in range(0, num_cands, self.RACE_CHUNK))
+
+        if num_cands == 0:
+            return None
+
+        survivors = None
+        means = None
+        used = 0
+
+        for r, iters in enumerate(schedule):
+            last = r == len(schedule) - 1
+            count = num_cands if survivors is None else len(survivors)
+            size = 1 if last else max(1, int(np.ceil(count * keep)))
+
+            if survivors is None:
+                survivors, means = self.race_first_round(score, chunks, iters, size)
+            else:
+                means = (means * used + score(survivors, iters, used) * iters) / (used + iters)
+                best = np.argsort(-means, kind="stable")[:size]
+                survivors, means = survivors[best], means[best]
+            used += iters
+
+            if len(survivors) == 1:
+                break
+
+        return survivors[np.argmax(means)]
+
+    # scores candidates RACE_CHUNK at a time, keeping the size best so far
+    def race_first_round(self, score, chunks, iters, size):
+        best = None
+        best_means = np.empty(0)
+
+        for chunk in chunks:
+            for start in range(0, len(chunk), self.RACE_CHUNK):
+                part = chunk[start:start + self.RACE_CHUNK]
+                best = part if best is None else np.concatenate((best, part))
+                best_means = np.concatenate((best_means, score(part, iters, 0)))
+
+                if len(best) > size:
+                    keep = np.sort(np.argpartition(-best_means, size)[:size])
+                    best, best_means = best[keep], best_means[keep]
+
+        return best, best_means
+
+    # distances from every source and to every target, kept in step with the
+    # sets so a node joining src_set only costs one more bfs
+    def get_set_distances(self):
+        csr = self.get_csr()
+        if self.set_dists is None:
+            self.set_dists = SetDistances(csr)
+
+        self.set_dists = self.set_dists.sync(csr, self.src_idx(csr),
+                                             np.sort(csr.to_index(self.trg_set)))
+        return self.set_dists
+
+    # betweenness of the current graph, cached until its edges change
+    def get_betweenness(self):
+        csr = self.get_csr()
+        if self.betweenness is None or self.betweenness.csr is not csr:
+            self.betweenness = Betweenness(csr)
+        return self.betweenness
+
+    # one sketch per (iteration, target) pair, matching the number of
+    # source-target trials a forward sample of iters cascades makes
+    def make_rr_index(self, iters=None):
+        if iters == None:
+            iters = self.DEFAULT_SAMPLING_ITERS
 
-        edges_to_remove = []
-        for edge in self.live_graph.edges():
-            if random.random() > self.LIVE_PROB:
-                edges_to_remove.append(edge)
+        csr = self.get_csr()
+        trgs = csr.to_index(self.trg_set)
+
+        sketches = []
+        for root in self.rng.choice(trgs, iters * len(trgs)):
+            sketches.append(csr.sample_reverse_reach(self.rng, self.LIVE_PROB, [root]))
+
+        return RRIndex(sketches, csr.num_nodes, len(trgs))
+
+    # sorted so seed choices don't depend on set iteration order
+    def src_idx(self, csr):
+        return np.sort(csr.to_index(self.src_set))
+
+    # splits iters into fixed-size chunks, each with its own child seed, and sums
+    # the kernel's results over them in order. chunking doesn't depend on the
+    # worker count, so a seeded model gives the same answer with any workers.
+    # with a sample bank, chunks read bank rows from start onwards instead
+    def run_chunks(self, kernel, csr, args, iters, workers=None, start=0):
+        if workers == None:
+            workers = self.workers
+
+        chunks = [self.CHUNK_ITERS] * (iters // self.CHUNK_ITERS)
+        if iters % self.CHUNK_ITERS:
+            chunks.append(iters % self.CHUNK_ITERS)
+
+        if self.bank is not None:
+            offsets = start + np.cumsum([0] + chunks[:-1])
+            seeds = [self.bank.slice(int(offset), n, csr.num_edges)
+                     for offset, n in zip(offsets, chunks)]
+        else:
+            seeds = self.seed_seq.spawn(1)[0].spawn(len(chunks))
+
+        if workers <= 1 or len(chunks) <= 1:
+            results = [kernel(csr, self.LIVE_PROB, *args, n, seed)
+                       for n, seed in zip(chunks, seeds)]
+        else:
+            pool = self.get_pool(csr, workers)
+            futures = [pool.submit(run_worker_chunk, kernel, (self.LIVE_PROB, *args), n, seed)
+                       for n, seed in zip(chunks, seeds)]
+            results = [future.result() for future in futures]
+
+        return sum(results)
+
+    # runs a kernel for iters samples, or in precision mode round by round until
+    # the widest ci half-width is at most precision or max_iters are used.
+    # returns (mean, ci half-width, iters used). with a sample bank, rows are
+    # read from start onwards
+    def estimate(self, kernel, csr, args, iters, workers=None,
+                 precision=None, max_iters=None, start=0):
+        if precision == None:
+            totals = self.run_chunks(kernel, csr, args, iters, workers, start)
+            return totals[0] / iters, self.ci_half_width(totals, iters), iters
+
+        if max_iters == None:
+            max_iters = self.DEFAULT_MAX_ITERS
+
+        totals = 0
+        done = 0
+        while done < max_iters:
+            n = min(self.PRECISION_ROUND_ITERS, max_iters - done)
+            totals = totals + self.run_chunks(kernel, csr, args, n, workers, start + done)
+            done += n
+
+            ci = self.ci_half_width(totals, done)
+            if np.max(ci) <= precision:
+                break
+
+        return totals[0] / done, ci, done
+
+    # half-width of the normal confidence interval from running sums
+    def ci_half_width(self, totals, iters):
+        if iters < 2:
+            return np.full_like(totals[0], np.inf, dtype=float)
+
+        mean = totals[0] / iters
+        var = np.maximum(totals[1] / iters - mean ** 2, 0) * iters / (iters - 1)
+        return self.CI_Z * np.sqrt(var / iters)
+
+    # workers keep the csr they were started with, so restart them if it changed
+    def get_pool(self, csr, workers):
+        if self.pool is not None and (self.pool_csr is not csr
+                                      or self.pool._max_workers != workers):
+            self.close()
+
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(workers, initializer=init_worker,
+                                            initargs=(csr,))
+            self.pool_csr = csr
+
+        return self.pool
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+            self.pool_csr = None
 
-        for edge in edges_to_remove:
-            u, v = edge
-            self.live_graph.remove_edge(u, v)
+    def make_live_graph(self):
+        csr = self.get_csr()
+        self.live_graph = csr.live(csr.live_mask(self.rng, self.LIVE_PROB))
 
     # this assumes that the live graph has been made/set
     def get_active_trg_count(self):
-        total_active_trg = 0
+        csr = self.live_graph.csr
+        reached = self.live_graph.reach(csr.to_index(self.init_nodes))
+
+        return int(reached[csr.to_index(self.trg_set)].sum())
+
+    ## overlay edits
+
+    def add_shortcut(self, u, v):
+        if u not in self.base_csr.index or v not in self.base_csr.index:
+            raise ValueError(f"shortcut ({u}, {v}) must join nodes of the graph")
+        if self.graph.has_edge(u, v):
+            return
+
+        self.graph.add_edge(u, v)
+        self.delta_log.append(("edge", u, v))
+        self.delta_edges.append((self.base_csr.index[u], self.base_csr.index[v]))
+
+    def recruit(self, node):
+        if node in self.src_set:
+            return
+
+        self.src_set.add(node)
+        self.delta_log.append(("src", node))
+
+    def checkpoint(self):
+        return len(self.delta_log)
+
+    # undoes every edit made since the checkpoint, newest first
+    def rollback(self, checkpoint=0):
+        while len(self.delta_log) > checkpoint:
+            entry = self.delta_log.pop()
+            if entry[0] == "edge":
+                self.graph.remove_edge(entry[1], entry[2])
+                self.delta_edges.pop()
+                self.csr_prefixes.pop(len(self.delta_edges) + 1, None)
+            else:
+                self.src_set.discard(entry[1])
+
+    # csr of the base graph plus the logged shortcuts. edges added to
+    # self.graph without going through add_shortcut fall back to a rebuild
+    def get_csr(self):
+        if self.graph.number_of_edges() != self.base_csr.num_edges + len(self.delta_edges):
+            return super().get_csr()
+
+        k = len(self.delta_edges)
+        if k not in self.csr_prefixes:
+            j = max(self.csr_prefixes)
+            self.csr_prefixes[k] = self.csr_prefixes[j].extend(self.delta_edges[j:])
+
+        self.csr = self.csr_prefixes[k]
+        return self.csr
 
-        for trg in self.trg_set:
-            for src in self.init_nodes:
-                if nx.has_path(self.live_graph, src, trg):
-                    total_active_trg += 1
-                    break
+    def reset(self):
+        self.rollback(0)
 
-        return total_active_trg
+        # anything edited behind the log's back
+        if self.graph.number_of_edges() != self.base_csr.num_edges:
+            base = set(zip(self.base_csr.src.tolist(), self.base_csr.dst.tolist()))
+            self.graph.remove_edges_from([(u, v) for u, v in self.graph.edges
+                                          if (self.base_csr.index[u], self.base_csr.index[v]) not in base])
 
-    def reset(self):
-        self.graph = self.init_graph.copy()
         self.src_set = self.init_src_set.copy()
         self.trg_set = self.init_trg_set.copy()
+
+        # every run from the start draws the same numbers, whatever ran before
+        # it on this model (eg which jobs a worker process got first)
+        self.rng = np.random.default_rng(self.rng_seed)
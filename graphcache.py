@@ -0,0 +1,147 @@
+import networkx as nx
+import numpy as np
+import hashlib
+import json
+import os
+from csrgraph import CSRGraph, make_indptr
+
+# compiled copy of an adjlist file, kept in a <file>.csr directory next to it:
+# node labels, the csr offsets and indices (rows in node order, each row in
+# file order, so positions are the edge ids CSRGraph.from_networkx would
+# give), the csr position of every edge in file order, and a meta.json
+# recording the source file it was built from. arrays are .npy files, memory
+# mapped when loaded. the cache is fresh while the source's size and mtime
+# are unchanged, or its hash matches
+CACHE_SUFFIX = ".csr"
+CACHE_VERSION = 2
+HASH_BLOCK = 2 ** 20
+
+
+def cache_dir(path):
+    return path + CACHE_SUFFIX
+
+
+def file_hash(path):
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+# node labels in order of first appearance and (k, 2) edges in file order,
+# parsed the same way as nx.read_adjlist so graphs built from the cache have
+# the same node and edge order. repeated edges are only kept once
+def parse_adjlist(path, delimiter=None, comments="#"):
+    index = {}
+    edges = []
+
+    with open(path, "r") as f:
+        for line in f:
+            p = line.find(comments)
+            if p >= 0:
+                line = line[:p]
+            if not len(line):
+                continue
+
+            vlist = line.strip().split(delimiter)
+            u = index.setdefault(vlist[0], len(index))
+            for v in vlist[1:]:
+                edges.append((u, index.setdefault(v, len(index))))
+
+    edges = np.array(edges, dtype=np.int64).reshape(-1, 2)
+    _, first = np.unique(edges[:, 0] * max(len(index), 1) + edges[:, 1], return_index=True)
+
+    return list(index), edges[np.sort(first)]
+
+
+def write_cache(path, nodes, edges, delimiter=None):
+    stat = os.stat(path)
+    meta = {"version": CACHE_VERSION, "delimiter": delimiter,
+            "size": stat.st_size, "mtime": stat.st_mtime_ns, "sha1": file_hash(path)}
+
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    order = np.argsort(edges[:, 0], kind="stable")
+    position = np.empty(len(edges), dtype=np.int64)
+    position[order] = np.arange(len(edges))
+
+    out = cache_dir(path)
+    os.makedirs(out, exist_ok=True)
+    np.save(os.path.join(out, "nodes.npy"), np.array(nodes, dtype=str))
+    np.save(os.path.join(out, "indptr.npy"), make_indptr(edges[:, 0], len(nodes)))
+    np.save(os.path.join(out, "indices.npy"), edges[order, 1])
+    np.save(os.path.join(out, "order.npy"), position)
+
+    # meta goes last, so a half written cache is never taken as fresh
+    with open(os.path.join(out, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+
+def is_fresh(path, delimiter=None):
+    try:
+        with open(os.path.join(cache_dir(path), "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    if meta.get("version") != CACHE_VERSION or meta.get("delimiter") != delimiter:
+        return False
+
+    stat = os.stat(path)
+    if stat.st_size != meta["size"]:
+        return False
+
+    # a touched but unchanged file is still fresh, and is stamped as such
+    if stat.st_mtime_ns != meta["mtime"]:
+        if file_hash(path) != meta["sha1"]:
+            return False
+        meta["mtime"] = stat.st_mtime_ns
+        with open(os.path.join(cache_dir(path), "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    return True
+
+
+# (node labels, indptr, indices, file order) for an adjlist file, the arrays
+# memory mapped, building the cache first if it is missing or stale
+def load_arrays(path, delimiter=None):
+    if not is_fresh(path, delimiter):
+        nodes, edges = parse_adjlist(path, delimiter)
+        write_cache(path, nodes, edges, delimiter)
+
+    out = cache_dir(path)
+    nodes = np.load(os.path.join(out, "nodes.npy")).tolist()
+    return (nodes,) + tuple(np.load(os.path.join(out, name + ".npy"), mmap_mode="r")
+                            for name in ("indptr", "indices", "order"))
+
+
+def to_csr(nodes, indptr, indices):
+    src = np.repeat(np.arange(len(nodes), dtype=np.int64), np.diff(indptr))
+    return CSRGraph(nodes, src, indices)
+
+
+def to_graph(nodes, indptr, indices, order):
+    src = np.repeat(np.arange(len(nodes), dtype=np.int64), np.diff(indptr))
+
+    graph = nx.DiGraph()
+    graph.add_nodes_from(nodes)
+    graph.add_edges_from((nodes[u], nodes[v]) for u, v in
+                         zip(src[order].tolist(), np.asarray(indices)[order].tolist()))
+    return graph
+
+
+def load_csr(path, delimiter=None):
+    nodes, indptr, indices, _ = load_arrays(path, delimiter)
+    return to_csr(nodes, indptr, indices)
+
+
+# drop-in for nx.read_adjlist(path, delimiter=..., create_using=nx.DiGraph)
+def load_graph(path, delimiter=None):
+    return to_graph(*load_arrays(path, delimiter))
+
+
+# the graph along with its csr, read from one load of the cache. passing the
+# csr to the model saves it rebuilding one from the graph
+def load_graph_csr(path, delimiter=None):
+    nodes, indptr, indices, order = load_arrays(path, delimiter)
+    return to_graph(nodes, indptr, indices, order), to_csr(nodes, indptr, indices)
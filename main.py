@@ -1,16 +1,236 @@
-import networkx as nx
 from familiarity import FamiliartyModel as Fam
+from graphcache import load_graph_csr
+from shortcutpicker import ShortcutPicker
 from pathpicker import PathPicker
+from recruitpicker import NodeRecruitPicker as RecruitPicker
+from sigmacache import SigmaCache
+from concurrent.futures import ProcessPoolExecutor
 import random
 import sys
 import matplotlib.pyplot as plt
 import numpy as np
 
-USAGE_MSG = "Usage: main <graph file name> <mode>"
-MODES = ["RESTRICTED", "PATHS", "BASE"]
+USAGE_MSG = ("Usage: main <graph file name> [job ...] [--budget N] [--hops N] "
+             "[--set-size N] [--seed N] [--workers N] [--no-plot] [--fresh-samples] "
+             "[--sigma-cache FILE]")
 
-if (len(sys.argv) <= 2):
-    print(f"Not enough arguments. {USAGE_MSG}")
-    sys.exit()
+# a job is <kind>[:<picker>[:<hops>]], eg shortcut, path:shortest or
+# recruit:in_degree:2. without a picker every ready picker of the kind runs.
+# recruit pickers ending in _maps rank nodes once from the multihop degree
+# maps instead of picking again every budget step
+MODES = ["shortcut", "restricted", "path", "recruit"]
+MAX_BUDGET = 12
 
-inp_file = sys.argv[1]
+
+## job running. every job shares one model and one picker per kind, so the
+## graph is loaded once and csr, distance and betweenness caches carry over
+
+# one picker per kind, made the first time a job needs it
+class Pickers(dict):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def __missing__(self, kind):
+        if kind == "shortcut":
+            picker = ShortcutPicker(self.model)
+        elif kind == "restricted":
+            picker = ShortcutPicker(self.model, restricted=True)
+        elif kind == "path":
+            picker = PathPicker(self.model)
+        else:
+            picker = RecruitPicker(self.model)
+
+        self[kind] = picker
+        return picker
+
+def parse_jobs(specs, pickers, max_hops=1):
+    jobs = []
+    for spec in specs:
+        parts = spec.split(":")
+        kind = parts[0]
+        if kind not in MODES:
+            raise ValueError(f"invalid job kind {kind}, must be one of {', '.join(MODES)}")
+
+        if len(parts) > 1:
+            names = [parts[1]]
+        else:
+            names = [func.__name__ for func in pickers[kind].ready_pickers]
+
+        for name in names:
+            if len(parts) > 2:
+                hop_range = [int(parts[2])]
+            elif kind == "recruit" and (name.endswith("_maps") or max_hops > 1 and
+                                        getattr(pickers[kind], name) in pickers[kind].degree_pickers):
+                hop_range = range(1, max_hops + 1)
+            else:
+                hop_range = [None]
+
+            jobs.extend((kind, name, hops) for hops in hop_range)
+
+    return jobs
+
+# labels for raw.csv, the legend and run's results. with_kind is for runs
+# mixing kinds, where pickers of different kinds can share a name; runs of
+# one kind keep the bare names the drivers always wrote
+def job_label(job, with_kind=False):
+    kind, name, hops = job
+    label = name if hops == None else f"{name}{hops}"
+    return f"{kind}:{label}" if with_kind else label
+
+# familiarity after each budget step for one job, starting from the initial
+# graph and sets
+def run_job(model, pickers, job, budgets):
+    kind, name, hops = job
+    func = getattr(pickers[kind], name)
+    model.reset()
+
+    res = np.array([])
+
+    # static ranking from the degree maps, computed once
+    util_map = None
+    if name.endswith("_maps"):
+        util_map = dict(func(hops)[hops-1])
+
+    for i in range(max(budgets)):
+        if util_map is not None:
+            best = max(util_map, key=util_map.get) if util_map else None
+            util_map.pop(best, None)
+        else:
+            best = func() if hops == None else func(hops)
+
+        if best == None or (kind == "path" and len(best) == 0):
+            print(f"WARNING: Nothing found by {job_label(job, True)} for budget {i}")
+        elif kind == "recruit":
+            model.recruit(best)
+        elif kind == "path":
+            for u, v in best:
+                model.add_shortcut(u, v)
+        else:
+            u, v = best
+            model.add_shortcut(u, v)
+
+        if i+1 in budgets:
+            res = np.append(res, model.sigma())
+
+    model.reset()
+    return res
+
+# jobs run in worker processes each keep their own model and pickers, built
+# once when the worker starts
+worker_model = None
+worker_pickers = None
+
+def init_worker(graph, csr, src_set, trg_set, seed, bank, cache_file):
+    global worker_model, worker_pickers
+    worker_model = Fam(graph, src_set, trg_set, seed=seed, bank=bank,
+                       sigma_cache=SigmaCache(path=cache_file), csr=csr)
+    worker_pickers = Pickers(worker_model)
+
+def run_worker_job(job, budgets):
+    return run_job(worker_model, worker_pickers, job, budgets)
+
+
+## experiment
+
+# random source and target sets, by default min(30, n/6) nodes each
+def sample_sets(graph, set_size=None, seed=None):
+    if set_size == None:
+        set_size = min(30, int(graph.number_of_nodes() / 6))
+
+    random_nodes = random.Random(seed).sample(tuple(graph.nodes), 2 * set_size)
+    return set(random_nodes[:set_size]), set(random_nodes[set_size:])
+
+def run(inp_file, specs, max_budget=MAX_BUDGET, max_hops=1, set_size=None,
+        seed=None, workers=1, plot=True, raw_file="raw.csv", bank=True, cache_file=None):
+    G, csr = load_graph_csr(inp_file, delimiter="\t")
+    print(G)
+
+    src_set, trg_set = sample_sets(G, set_size, seed)
+    print(f"Initial source and target size: {len(src_set)}")
+
+    # every picker is evaluated on the same bank of samples, so curves differ
+    # by the picks rather than by noise. identical configurations (eg two
+    # pickers making the same first pick) are only evaluated once, across
+    # reruns too with a cache file
+    model = Fam(G, src_set, trg_set, seed=seed, bank=bank,
+                sigma_cache=SigmaCache(path=cache_file), csr=csr)
+    pickers = Pickers(model)
+
+    init_sigma = model.sigma()
+    print(f"Initial familiarity: {init_sigma}")
+
+    budgets = np.array([x for x in range(1, max_budget+1)])
+    jobs = parse_jobs(specs, pickers, max_hops)
+
+    with_kind = len({kind for kind, _, _ in jobs}) > 1
+    labels = [job_label(job, with_kind) for job in jobs]
+
+    # workers get the seed the model resolved, so without --seed they still
+    # share its sample bank
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(workers, initializer=init_worker,
+                                 initargs=(G, csr, src_set, trg_set, model.seed_seq.entropy,
+                                           bank, cache_file)) as pool:
+            futures = [pool.submit(run_worker_job, job, budgets) for job in jobs]
+            results = [future.result() for future in futures]
+    else:
+        results = [run_job(model, pickers, job, budgets) for job in jobs]
+
+    if plot:
+        plt.figure()
+        ax = plt.subplot(111)
+
+    for func_name, res in zip(labels, results):
+        # save raw results (with init sigma) in csv
+        with open(raw_file, "a") as raw:
+            raw.write(f"{func_name},{init_sigma},{','.join(['%.5f' % s for s in res])}\n")
+
+        print(func_name, res)
+        if plot:
+            ax.plot(np.append(0, budgets), np.append(init_sigma, res), 'o-',
+                    label=func_name, linewidth=2)
+
+    if plot:
+        box = ax.get_position()
+        ax.set_position([box.x0, box.y0 + box.height * 0.1,
+                         box.width, box.height * 0.9])
+
+        plt.xticks(np.arange(0, max_budget+1, 2))
+        plt.xlabel("Budget")
+        plt.ylabel("Network Familiarity")
+
+        ax.legend(loc='upper center', bbox_to_anchor=(0.5, -0.05),
+                  fancybox=True, shadow=True, ncol=3)
+        plt.show()
+
+    return init_sigma, dict(zip(labels, results))
+
+
+if __name__ == "__main__":
+    args = []
+    options = {}
+
+    argv = iter(sys.argv[1:])
+    for arg in argv:
+        if arg == "--no-plot":
+            options["plot"] = False
+        elif arg == "--fresh-samples":
+            options["bank"] = False
+        elif arg == "--sigma-cache":
+            options["cache_file"] = next(argv, None)
+        elif arg in ("--budget", "--hops", "--set-size", "--seed", "--workers"):
+            value = next(argv, None)
+            if value == None or not value.isdigit():
+                print(f"Invalid value for {arg}. {USAGE_MSG}")
+                sys.exit()
+            key = {"--budget": "max_budget", "--hops": "max_hops"}.get(arg, arg[2:].replace("-", "_"))
+            options[key] = int(value)
+        else:
+            args.append(arg)
+
+    if len(args) < 1:
+        print(f"Not enough arguments. {USAGE_MSG}")
+        sys.exit()
+
+    run(args[0], args[1:] or ["shortcut"], **options)
@@ -0,0 +1,143 @@
+import numpy as np
+
+
+# candidate shortcut paths for every (source, target) pair: the shortest
+# simple paths of at most cutoff edges that use between 1 and max_new_edges
+# new edges, ie s ~> a1 -> b1 ~> a2 -> b2 ~> ... ~> t where each ai -> bi is
+# a new edge and ~> is a shortest path of existing edges (possibly empty, so
+# new edges can follow each other). enumerating every simple path in the
+# complete graph explodes, while these come straight from the distance table.
+# paths are stored flat as node ids with csr-style offsets
+class PathIndex:
+    PATHS_PER_PAIR = 10  # per number of new edges
+    MAX_NEW_EDGES = 2
+
+    def __init__(self, table, src, trgs, cutoff, paths_per_pair=None, max_new_edges=None):
+        if paths_per_pair == None:
+            paths_per_pair = self.PATHS_PER_PAIR
+        if max_new_edges == None:
+            max_new_edges = self.MAX_NEW_EDGES
+
+        self.table = table
+        self.csr = table.csr
+        n = self.csr.num_nodes
+
+        self.adj = np.zeros((n, n), dtype=bool)
+        self.adj[self.csr.src, self.csr.dst] = True
+        np.fill_diagonal(self.adj, True)  # no self-loop shortcuts
+
+        flat = []
+        indptr = [0]
+        pairs = []
+        tails = {}
+        for s in src:
+            for t in trgs:
+                if s == t:
+                    continue
+                if t not in tails:
+                    tails[t] = self.tail_costs(int(t), max_new_edges - 1)
+                for path in self.pair_paths(int(s), int(t), tails[t], cutoff, paths_per_pair):
+                    flat.extend(path)
+                    indptr.append(len(flat))
+                    pairs.append((s, t))
+
+        self.nodes = np.array(flat, dtype=np.int64)
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def path_nodes(self, i):
+        return self.nodes[self.indptr[i]:self.indptr[i+1]]
+
+    def path_lengths(self):
+        return np.diff(self.indptr) - 1
+
+    # path i as a list of (u, v) node label edges
+    def edges(self, i):
+        labels = [self.csr.nodes[x] for x in self.path_nodes(i)]
+        return list(zip(labels[:-1], labels[1:]))
+
+    def paths(self):
+        return [self.edges(i) for i in range(len(self))]
+
+    # shortest paths from every node to t using exactly j new edges, for j up
+    # to max_new: (costs, hop_a, hop_b) where costs[j][x] is the length, the
+    # path's first new edge is hop_a[j][x] -> hop_b[j][hop_a[j][x]], and ties
+    # go to the lowest node ids
+    def tail_costs(self, t, max_new):
+        dist = self.table.dist.astype(np.int64)
+        costs = [dist[:, t]]
+        hop_a = [None]
+        hop_b = [None]
+
+        for j in range(max_new):
+            through = np.where(self.adj, self.table.UNREACHABLE, 1 + costs[-1][None, :])
+            hop_b.append(np.argmin(through, axis=1))
+            first = through[np.arange(len(through)), hop_b[-1]]
+
+            through = dist + first[None, :]
+            hop_a.append(np.argmin(through, axis=1))
+            costs.append(through[np.arange(len(through)), hop_a[-1]])
+
+        return costs, hop_a, hop_b
+
+    # up to k shortest simple paths from s to t for each number of new edges,
+    # by length then first new edge (a, b)
+    def pair_paths(self, s, t, tail, cutoff, k):
+        costs = tail[0]
+        rtn = []
+        for j in range(len(costs)):
+            lengths = self.table.dist[s, :, None] + 1 + costs[j][None, :]
+            lengths[self.adj] = self.table.UNREACHABLE
+            rtn.extend(self.first_edge_paths(s, t, j, tail, lengths.ravel(), cutoff, k))
+        return rtn
+
+    # paths s ~> a -> b, then j more new edges to t, in order of the lengths
+    # of every (a, b)
+    def first_edge_paths(self, s, t, j, tail, lengths, cutoff, k):
+        # most pairs only need the first few candidates, so try a partial sort
+        # of a small batch before sorting everything
+        for batch in (4 * k, len(lengths)):
+            if batch < len(lengths):
+                codes = np.argpartition(lengths, batch)[:batch]
+            else:
+                codes = np.arange(len(lengths))
+            codes = codes[lengths[codes] <= cutoff]
+            codes = codes[np.lexsort((codes, lengths[codes]))]
+
+            rtn = []
+            for code in codes:
+                a, b = divmod(int(code), self.csr.num_nodes)
+                path = self.shortest_path(s, a) + self.tail_path(b, t, j, tail)
+
+                # the pieces may cross, in which case it isn't a simple path
+                if len(set(path)) == len(path):
+                    rtn.append(path)
+                    if len(rtn) == k:
+                        return rtn
+
+            if batch >= len(lengths) or len(codes) < batch:
+                return rtn
+
+        return rtn
+
+    # shortest path from x to t with exactly j new edges, see tail_costs
+    def tail_path(self, x, t, j, tail):
+        _, hop_a, hop_b = tail
+        path = [x]
+        for level in range(j, 0, -1):
+            a = int(hop_a[level][path[-1]])
+            path.extend(self.shortest_path(path[-1], a)[1:])
+            path.append(int(hop_b[level][a]))
+        return path + self.shortest_path(path[-1], t)[1:]
+
+    # one shortest path of existing edges, lowest node ids first on ties
+    def shortest_path(self, s, t):
+        dist = self.table.dist
+        path = [s]
+        while path[-1] != t:
+            nbrs = self.csr.indices[self.csr.indptr[path[-1]]:self.csr.indptr[path[-1]+1]]
+            path.append(int(nbrs[dist[nbrs, t] == dist[path[-1], t] - 1].min()))
+        return path
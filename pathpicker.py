@@ -1,14 +1,21 @@
 import networkx as nx
 from familiarity import FamiliartyModel as Fam
-import random
+from pathindex import PathIndex
 import numpy as np
 
 class PathPicker:
     ready_pickers = []
 
-    def __init__(self, fm: Fam):
+    def __init__(self, fm: Fam, paths_per_pair=None, schedule=None, max_new_edges=None):
         self.fm = fm
         self.cutoff = self.fm.graph.number_of_nodes() / 10
+        self.paths_per_pair = paths_per_pair
+        self.max_new_edges = max_new_edges  # new edges a candidate path may use
+        self.schedule = schedule  # greedy's iters per round, None for the default
+
+        # shared by every picker, rebuilt only once the graph or sets change
+        self.path_index = None
+        self.path_index_key = None
 
         # change this as needed to change what is tested
         self.ready_pickers = [self.greedy, 
@@ -17,45 +24,38 @@ class PathPicker:
                               self.avg_closeness,
                               self.avg_betweenness]
 
+    def get_path_index(self):
+        csr = self.fm.get_csr()
+        key = (csr, frozenset(self.fm.src_set), frozenset(self.fm.trg_set))
+
+        if self.path_index is None or key != self.path_index_key:
+            self.path_index = PathIndex(self.fm.get_distance_table(),
+                                        np.sort(csr.to_index(self.fm.src_set)),
+                                        np.sort(csr.to_index(self.fm.trg_set)),
+                                        self.cutoff, self.paths_per_pair, self.max_new_edges)
+            self.path_index_key = key
+
+        return self.path_index
+
     def candidate_paths(self):
-        rtn_list = []
-
-        complete_graph = nx.complete_graph(self.fm.graph.nodes)
-
-        for s in self.fm.src_set:
-            for t in self.fm.trg_set:
-                for path in nx.all_simple_edge_paths(complete_graph, s, t, self.cutoff):
-                    for edge in path:
-                        u, v = edge
-                        if not self.fm.graph.has_edge(u, v):
-                            rtn_list.append(path)
-                            break
-        
-        return rtn_list
+        return self.get_path_index().paths()
     
     def random(self):
-        return random.choice(self.candidate_paths())
+        candidate_paths = self.candidate_paths()
+        if len(candidate_paths) == 0:
+            return []
+        return candidate_paths[self.fm.rng.integers(len(candidate_paths))]
 
+    # successive halving: cheap estimates for every path, then more samples
+    # for a shrinking set of the best
     def greedy(self):
-        best_sigma = -1
-        best_path = []
-
         candidate_paths = self.candidate_paths()
 
-        sigmas = self.fm.sigma_optm_paths(candidate_paths, 50)
-
-        next_selection_size = int(len(sigmas) / 10)            
-        best_idx = np.argpartition(sigmas, -next_selection_size)[-next_selection_size:]
-
-        next_selection = []
-        for i in best_idx:
-            next_selection.append(candidate_paths[i])
+        score = lambda idx, iters, start: self.fm.sigma_optm_paths([candidate_paths[i] for i in idx],
+                                                                   iters, start=start)
+        best = self.fm.race(score, len(candidate_paths), self.schedule)
 
-        sigmas = self.fm.sigma_optm_paths(candidate_paths, 150)
-        # index of best path in next selection
-        best_idx = np.argpartition(sigmas, -1)[-1:]
-
-        return candidate_paths[best_idx]
+        return [] if best == None else candidate_paths[best]
 
     def shortest(self):
         best_path = []
@@ -73,13 +73,13 @@ class PathPicker:
         best_path = []
 
         for path in self.candidate_paths():
-            temp_graph = self.fm.graph.copy()
-            for edge in path:
-                u, v = edge
-                if not temp_graph.has_edge(u, v):
-                    temp_graph.add_edge(u, v)
+            # score the path's edges in place, then undo them
+            checkpoint = self.fm.checkpoint()
+            for u, v in path:
+                self.fm.add_shortcut(u, v)
 
-            all_betweeness = nx.edge_betweenness_centrality(temp_graph)
+            all_betweeness = nx.edge_betweenness_centrality(self.fm.graph)
+            self.fm.rollback(checkpoint)
             current_btw = 0
             for edge in path:
                 current_btw += all_betweeness[edge]
@@ -96,13 +96,12 @@ class PathPicker:
         best_path = []
 
         for path in self.candidate_paths():
-            temp_graph = self.fm.graph.copy()
-            for edge in path:
-                u, v = edge
-                if not temp_graph.has_edge(u, v):
-                    temp_graph.add_edge(u, v)
+            checkpoint = self.fm.checkpoint()
+            for u, v in path:
+                self.fm.add_shortcut(u, v)
 
-            all_closeness = nx.closeness_centrality(temp_graph)
+            all_closeness = nx.closeness_centrality(self.fm.graph)
+            self.fm.rollback(checkpoint)
             
             # loop adds closness of target for each edge, so add the first
             # node's closeness manually
@@ -1,13 +1,15 @@
 import networkx as nx
 from familiarity import FamiliartyModel as Fam
-import random
 import numpy as np
+from distances import discovery_order
 
 class NodeRecruitPicker:
     ready_pickers = []
 
-    def __init__(self, fm: Fam):
+    def __init__(self, fm: Fam, pivots=None):
         self.fm = fm
+        self.pivots = pivots  # sampled sources for global betweenness, None for all
+        self.preds = None  # (csr, indptr, indices) from pred_arrays
 
         # change this as needed to change what is tested
         self.ready_pickers = [self.greedy, 
@@ -30,30 +32,23 @@ class NodeRecruitPicker:
                                           self.get_both_degree_maps]
 
     def greedy(self):
-        util_map = self.fm.get_node_to_source_fam_map()
+        util_map = self.fm.get_node_to_source_fam_map(rr=True)
         return max(util_map, key=util_map.get)
 
+    # drawn from the model's rng over the graph's node order, so a seeded
+    # model picks the same nodes every run
     def random(self):
-        candidates = set(self.fm.graph.nodes)
-        for node in self.fm.src_set:
-            candidates.remove(node)
-        for node in self.fm.trg_set:
-            candidates.remove(node)
+        candidates = [node for node in self.fm.graph.nodes
+                      if node not in self.fm.src_set and node not in self.fm.trg_set]
 
         if len(candidates) == 0:
             return None
 
-        return random.choice(list(candidates))
+        return candidates[self.fm.rng.integers(len(candidates))]
     
     def betweenness_global(self):
-        util_map = nx.betweenness_centrality(self.fm.graph)
-
-        for node in self.fm.src_set:
-            del util_map[node]
-        for node in self.fm.trg_set:
-            del util_map[node]
-
-        return max(util_map, key=util_map.get)
+        scores, _ = self.fm.get_betweenness().global_scores(self.pivots, self.fm.rng)
+        return self.best_stray(scores)
 
     def closeness_global(self):
         util_map = nx.closeness_centrality(self.fm.graph)
@@ -66,162 +61,137 @@ class NodeRecruitPicker:
         return max(util_map, key=util_map.get)
     
     def betweenness_subset(self):
-        util_map = nx.betweenness_centrality_subset(self.fm.graph, 
-                                list(self.fm.src_set), list(self.fm.trg_set))
-
-        for node in self.fm.src_set:
-            del util_map[node]
-        for node in self.fm.trg_set:
-            del util_map[node]
+        csr = self.fm.get_csr()
+        scores = self.fm.get_betweenness().subset_scores(self.fm.src_idx(csr),
+                                                         csr.to_index(self.fm.trg_set))
+        return self.best_stray(scores)
+
+    # highest scoring node outside the source and target sets, given scores
+    # for every node index
+    def best_stray(self, scores):
+        csr = self.fm.get_csr()
+        strays = np.ones(csr.num_nodes, dtype=bool)
+        strays[csr.to_index(self.fm.src_set)] = False
+        strays[csr.to_index(self.fm.trg_set)] = False
+        if not strays.any():
+            return None
 
-        return max(util_map, key=util_map.get)
+        candidates = np.flatnonzero(strays)
+        return csr.nodes[candidates[np.argmax(scores[candidates])]]
 
+    # minimises the summed distance from the sources and to the targets, which
+    # gives the same node as maximising closeness over those pairs
     def closeness_subset(self):
-        util_map = {}
-
-        for node in self.fm.graph.nodes:
-            path_length_sum = 0
-
-            if node in self.fm.src_set or node in self.fm.trg_set:
-                continue
-
-            for s in self.fm.src_set:
-                try:
-                    path_length_sum += nx.shortest_path_length(self.fm.graph,
-                                                                source=s,
-                                                                target=node)
-                except:
-                    # just add number of nodes in full graph to discourage no paths
-                    path_length_sum += self.fm.graph.number_of_nodes()
-            for t in self.fm.trg_set:
-                try:
-                    path_length_sum += nx.shortest_path_length(self.fm.graph,
-                                                                source=node,
-                                                                target=t)
-                except:
-                    # just add number of nodes in full graph to discourage no paths
-                    path_length_sum += self.fm.graph.number_of_nodes()
-                
-            # closeness is reciprocal of sum, but just minimise and still gets the best
-            util_map[node] = path_length_sum
-
-        return min(util_map, key=util_map.get)
-    
-    def in_degree(self, hops=1):
-        util_map = {}
+        index = self.fm.get_set_distances()
+        csr = index.csr
 
-        for s in self.fm.src_set:
-            path_lens = nx.single_source_shortest_path_length(self.fm.graph, s, hops)
-            for node in path_lens:
-                if node in self.fm.src_set or node in self.fm.trg_set:
-                    continue
-                util_map[node] = util_map.get(node, 0) + (1 / path_lens[node])
+        # just add number of nodes in full graph to discourage no paths
+        path_length_sum = np.zeros(csr.num_nodes, dtype=np.int64)
+        for dist in (index.from_sources(), index.to_targets()):
+            path_length_sum += np.where(dist == index.UNREACHABLE, csr.num_nodes, dist).sum(axis=0)
 
-        return max(util_map, key=util_map.get) if len(util_map) > 0 else None
+        return self.best_stray(-path_length_sum)
+    
+    def in_degree(self, hops=1):
+        return self.best_of(self.get_in_degree_maps(hops)[hops-1])
     
     def out_degree(self, hops=1):
-        util_map = {}
-
-        for t in self.fm.trg_set:
-            path_lens = nx.single_target_shortest_path_length(self.fm.graph, t, hops)
-            for node in path_lens:
-                if node in self.fm.src_set or node in self.fm.trg_set:
-                    continue
-                util_map[node] = util_map.get(node, 0) + (1 / path_lens[node])
-
-        return max(util_map, key=util_map.get) if len(util_map) > 0 else None
+        return self.best_of(self.get_out_degree_maps(hops)[hops-1])
     
     def both_degree(self, hops=1):
-        util_map = {}
-
-        for s in self.fm.src_set:
-            path_lens = nx.single_source_shortest_path_length(self.fm.graph, s, hops)
-            for node in path_lens:
-                if node in self.fm.src_set or node in self.fm.trg_set:
-                    continue
-                util_map[node] = util_map.get(node, 0) + (1 / path_lens[node])
-
-        for t in self.fm.trg_set:
-            path_lens = nx.single_target_shortest_path_length(self.fm.graph, t, hops)
-            for node in path_lens:
-                if node in self.fm.src_set or node in self.fm.trg_set:
-                    continue
-                util_map[node] = util_map.get(node, 0) + (1 / path_lens[node])
+        return self.best_of(self.get_both_degree_maps(hops)[hops-1])
 
+    def best_of(self, util_map):
         return max(util_map, key=util_map.get) if len(util_map) > 0 else None
     
     
-    ## time-efficient way of getting multihop degrees
+    ## time-efficient way of getting multihop degrees. map i holds, for every
+    ## node within i+1 hops, the sum of 1/dist over the sources (or targets).
+    ## seeds are taken in set iteration order and maps list nodes in the order
+    ## a bfs from them finds them, as the per-seed nx loops these replaced did,
+    ## so max() breaks ties the same way
     def get_in_degree_maps(self, hops):
-        hop_maps = []  # array to hold maps for 1 hop, then 2, then 3 etc
-
-        # populate hop map
-        for _ in range(hops):
-            hop_maps.append({})
-
-        for s in self.fm.src_set:
-            path_lens = nx.single_source_shortest_path_length(self.fm.graph, s, hops)
-
-            for hop in range(hops):
-                for node in path_lens:
-                    if node in self.fm.src_set or node in self.fm.trg_set:
-                        continue
-
-                    if path_lens[node] <= hops+1:
-                        hop_maps[hop][node] = hop_maps[hop].get(node, 0) + (1 / path_lens[node])
-
-        return hop_maps
+        return self.to_hop_maps(*self.source_rows(hops), hops)
 
     def get_out_degree_maps(self, hops):
-        hop_maps = []  # array to hold maps for 1 hop, then 2, then 3 etc
-
-        # populate hop map
-        for _ in range(hops):
-            hop_maps.append({})
-
-        for t in self.fm.trg_set:
-            path_lens = nx.single_target_shortest_path_length(self.fm.graph, t, hops)
-            path_lens = dict(path_lens)
-
-            for hop in range(hops):
-                for node in path_lens:
-                    if node in self.fm.src_set or node in self.fm.trg_set:
-                        continue
-
-                    if path_lens[node] <= hops+1:
-                        hop_maps[hop][node] = hop_maps[hop].get(node, 0) + (1 / path_lens[node])
-
-        return hop_maps
+        return self.to_hop_maps(*self.target_rows(hops), hops)
 
     def get_both_degree_maps(self, hops):
-        hop_maps = []  # array to hold maps for 1 hop, then 2, then 3 etc
-
-        # populate hop map
-        for _ in range(hops):
-            hop_maps.append({})
-
-        for s in self.fm.src_set:
-            path_lens = nx.single_source_shortest_path_length(self.fm.graph, s, hops)
-
-            for hop in range(hops):
-                for node in path_lens:
-                    if node in self.fm.src_set or node in self.fm.trg_set:
-                        continue
-
-                    if path_lens[node] <= hops+1:
-                        hop_maps[hop][node] = hop_maps[hop].get(node, 0) + (1 / path_lens[node])
-
-        for t in self.fm.trg_set:
-            path_lens = nx.single_target_shortest_path_length(self.fm.graph, t, hops)
-            path_lens = dict(path_lens)
-
-            for hop in range(hops):
-                for node in path_lens:
-                    if node in self.fm.src_set or node in self.fm.trg_set:
-                        continue
-
-                    if path_lens[node] <= hops+1:
-                        hop_maps[hop][node] = hop_maps[hop].get(node, 0) + (1 / path_lens[node])
-
-        return hop_maps
-    
\ No newline at end of file
+        in_dist, in_pos = self.source_rows(hops)
+        out_dist, out_pos = self.target_rows(hops)
+        return self.to_hop_maps(np.concatenate((in_dist, out_dist)),
+                                np.concatenate((in_pos, out_pos)), hops)
+
+    # distances from every source and bfs discovery positions, one row each
+    def source_rows(self, hops):
+        index = self.fm.get_set_distances()
+        csr = index.csr
+        seeds = csr.to_index(self.fm.src_set)
+
+        rows = {x: i for i, x in enumerate(index.src)}
+        dist = index.from_sources()[[rows[x] for x in seeds]]
+        return dist, discovery_order(csr.indptr, csr.indices, seeds, hops)
+
+    # distances to every target, searching predecessors in the graph's order
+    def target_rows(self, hops):
+        index = self.fm.get_set_distances()
+        csr = index.csr
+        seeds = csr.to_index(self.fm.trg_set)
+
+        rows = {x: i for i, x in enumerate(index.trgs)}
+        dist = index.to_targets()[[rows[x] for x in seeds]]
+        return dist, discovery_order(*self.pred_arrays(csr), seeds, hops)
+
+    # csr style predecessor lists, ordered as graph.pred holds them
+    def pred_arrays(self, csr):
+        if self.preds is None or self.preds[0] is not csr:
+            preds = [csr.to_index(self.fm.graph.pred[node]) for node in csr.nodes]
+            indptr = np.zeros(csr.num_nodes + 1, dtype=np.int64)
+            np.cumsum([len(p) for p in preds], out=indptr[1:])
+            self.preds = (csr, indptr, np.concatenate(preds + [np.empty(0, dtype=np.int64)]))
+        return self.preds[1:]
+
+    # 1/dist summed over the rows for each hop bound, along with which nodes
+    # each bound reaches. rows are added one at a time, so sums round as the
+    # per-seed loops did
+    def hop_scores(self, dist, hops):
+        bounds = np.arange(1, hops + 1)[:, None]
+        scores = np.zeros((hops, dist.shape[1]))
+        reached = np.zeros((hops, dist.shape[1]), dtype=bool)
+
+        for row in dist:
+            within = (row > 0) & (row <= bounds)
+            scores += np.where(within, 1 / np.maximum(row, 1), 0)
+            reached |= within
+
+        return scores, reached
+
+    # for each hop bound, the first row reaching each node within it and the
+    # node's discovery position in that row, as one sort key
+    def discovery_keys(self, dist, pos, hops):
+        n = dist.shape[1]
+        keys = np.zeros((hops, n), dtype=np.int64)
+        if len(dist) == 0:
+            return keys
+
+        for hop in range(hops):
+            first = np.argmax((dist > 0) & (dist <= hop + 1), axis=0)
+            keys[hop] = first * n + pos[first, np.arange(n)]
+        return keys
+
+    # per-hop dictionaries of reached nodes outside the source and target
+    # sets, in discovery order
+    def to_hop_maps(self, dist, pos, hops):
+        scores, reached = self.hop_scores(dist, hops)
+        keys = self.discovery_keys(dist, pos, hops)
+        csr = self.fm.get_csr()
+
+        reached[:, csr.to_index(self.fm.src_set)] = False
+        reached[:, csr.to_index(self.fm.trg_set)] = False
+
+        maps = []
+        for hop in range(hops):
+            nodes = np.flatnonzero(reached[hop])
+            nodes = nodes[np.argsort(keys[hop, nodes], kind="stable")]
+            maps.append({csr.nodes[i]: float(scores[hop, i]) for i in nodes})
+        return maps
@@ -0,0 +1,82 @@
+import numpy as np
+
+
+# pre-drawn monte carlo samples shared by every estimate of a model: one row
+# per sample holding a live-edge mask, packed 8 edges to a byte, and a
+# uniform draw that picks the seed node. reusing the same rows gives common
+# random numbers, so estimates for different graphs or pickers differ by
+# their actual effect rather than by sampling noise. edges keep their ids as
+# the csr grows, so columns for new edges are simply drawn and appended.
+# rows and columns are drawn in fixed blocks, each from its own seed, so what
+# the bank holds only depends on the seed and never on the order it grew in
+# (eg a worker whose first estimate is on a graph with shortcuts added)
+class SampleBank:
+    ROW_BLOCK = 64
+    COL_BLOCK = 1024  # edges, a multiple of 8
+
+    # spawn key tags, keeping the seeds of mask blocks, pick blocks and
+    # slices apart
+    MASK_KEY = 0
+    PICK_KEY = 1
+    SLICE_KEY = 2
+
+    def __init__(self, seed_seq, prob):
+        self.seed_seq = seed_seq
+        self.prob = prob
+
+        self.num_edges = 0
+        self.bits = np.empty((0, 0), dtype=np.uint8)
+        self.picks = np.empty(0)
+
+    def __len__(self):
+        return len(self.picks)
+
+    def block_seed(self, *key):
+        return np.random.SeedSequence(self.seed_seq.entropy,
+                                      spawn_key=self.seed_seq.spawn_key + key)
+
+    # packed masks for row block r and column block c
+    def mask_block(self, r, c):
+        rng = np.random.default_rng(self.block_seed(self.MASK_KEY, r, c))
+        return np.packbits(rng.random((self.ROW_BLOCK, self.COL_BLOCK)) < self.prob, axis=1)
+
+    # makes sure the bank holds rows samples over num_edges edges
+    def ensure(self, rows, num_edges):
+        have_rows = len(self) // self.ROW_BLOCK
+        have_cols = self.bits.shape[1] * 8 // self.COL_BLOCK
+        row_blocks = max(have_rows, -(-rows // self.ROW_BLOCK))
+        col_blocks = max(have_cols, 1, -(-num_edges // self.COL_BLOCK))
+
+        if col_blocks > have_cols and have_rows:
+            new = [np.concatenate([self.mask_block(r, c) for c in range(have_cols, col_blocks)], axis=1)
+                   for r in range(have_rows)]
+            self.bits = np.concatenate((self.bits, np.concatenate(new)), axis=1)
+
+        if row_blocks > have_rows:
+            new = [np.concatenate([self.mask_block(r, c) for c in range(col_blocks)], axis=1)
+                   for r in range(have_rows, row_blocks)]
+            self.bits = np.concatenate([self.bits] + new) if have_rows else np.concatenate(new)
+
+            picks = [np.random.default_rng(self.block_seed(self.PICK_KEY, r)).random(self.ROW_BLOCK)
+                     for r in range(have_rows, row_blocks)]
+            self.picks = np.concatenate([self.picks] + picks)
+
+        self.num_edges = max(self.num_edges, num_edges)
+
+    # rows [start, start + iters) for a kernel chunk. any other randomness in
+    # the chunk comes from a seed fixed by the rows, so it is common too
+    def slice(self, start, iters, num_edges):
+        self.ensure(start + iters, num_edges)
+        return BankSlice(self.bits[start:start + iters], self.picks[start:start + iters],
+                         num_edges, self.block_seed(self.SLICE_KEY, start, iters))
+
+
+class BankSlice:
+    def __init__(self, bits, picks, num_edges, seed):
+        self.bits = bits
+        self.picks = picks
+        self.num_edges = num_edges
+        self.seed = seed
+
+    def mask(self, i):
+        return np.unpackbits(self.bits[i], count=self.num_edges).astype(bool)
@@ -1,18 +1,34 @@
-import networkx as nx
 from familiarity import FamiliartyModel as Fam
-import random
+from distances import source_distances, closeness_after_insertion
+from candidates import CandidateSource, CandidateArray, bfs_levels
+from csrgraph import bfs
+import heapq
 import numpy as np
 
 class ShortcutPicker:
     ready_pickers = []
+    CELF_BATCH = 64  # stale candidates rescored together by lazy greedy
+    CELF_KEEP = 2 ** 14  # candidates lazy greedy queues, by their first gains
 
-    def __init__(self, fm: Fam, restricted=False):
+    def __init__(self, fm: Fam, restricted=False, lazy=True, pivots=None,
+                 candidate_limit=None, schedule=None):
         self.fm = fm
         self.restricted = restricted
+        self.lazy = lazy
+        self.pivots = pivots  # sampled sources for closeness, None for all pairs
+        self.candidate_limit = candidate_limit  # max shortcuts scored by greedy
+        self.schedule = schedule  # non-lazy greedy's iters per round
 
         if self.restricted:
             print("WARNING: picker running in restrcted mode")
 
+        # lazy greedy state, kept across budget steps
+        self.celf_heap = None
+        self.celf_candidates = None
+        self.celf_evaluated = None
+        self.celf_step = 0
+        self.celf_edge_count = None
+
         # change this as needed to change what is tested
         self.ready_pickers = [self.greedy, 
                               self.random,
@@ -22,124 +38,178 @@ class ShortcutPicker:
 
 
     def non_edges(self):
-        rtn = []
-
-        for s in self.fm.graph.nodes(): 
-            for t in self.fm.graph.nodes():
-                if not self.fm.graph.has_edge(s, t):
-                    rtn.append((s, t))
-
-        return rtn
+        return [(u, v) for u, v in self.to_label_pairs(CandidateSource(self.fm.get_csr()))]
     
     def non_edges_between_st(self):
-        rtn = []
+        csr = self.fm.get_csr()
+        source = CandidateSource(csr, csr.to_index(self.fm.src_set), csr.to_index(self.fm.trg_set))
+        return [(u, v) for u, v in self.to_label_pairs(source)]
 
-        for s in self.fm.src_set:
-            for t in self.fm.trg_set:
-                if not self.fm.graph.has_edge(s, t):
-                    rtn.append((s, t))
+    def to_label_pairs(self, source):
+        nodes = source.csr.nodes
+        for u, v in source.array():
+            yield (nodes[u], nodes[v])
 
-        return rtn
-
-    def greedy(self):
-        best_shortcut = None
-        best_sigma = -1
+    # all candidate shortcuts for the current graph, streamed in chunks
+    def candidate_source(self):
+        csr = self.fm.get_csr()
 
         if self.restricted:
-            candidates = self.non_edges_between_st()
+            return CandidateSource(csr, csr.to_index(self.fm.src_set),
+                                   csr.to_index(self.fm.trg_set))
+        return CandidateSource(csr)
+
+    # greedy only needs shortcuts out of nodes the sources reach and into nodes
+    # that reach a target, every other shortcut has zero gain. optionally cut
+    # down further to the candidate_limit best by a cheap bound: the chance of
+    # a path of that length from the sources staying live, times the number of
+    # targets v can reach. returns a candidate source for streaming
+    def greedy_candidates(self):
+        source = self.candidate_source()
+        csr = source.csr
+        src = csr.to_index(self.fm.src_set)
+        trgs = csr.to_index(self.fm.trg_set)
+
+        # with nothing left every shortcut has zero gain, so any one will do
+        pruned = source.reachable_from(src).reaching(trgs)
+        if len(pruned) == 0:
+            pair = source.sample(self.fm.rng)
+            return CandidateArray(csr, [] if pair is None else [pair])
+
+        if self.candidate_limit == None:
+            return pruned
+
+        levels = bfs_levels(csr, src)
+        score_u = np.where(levels >= 0, self.fm.LIVE_PROB ** levels.astype(float), 0)
+
+        indptr, indices, _ = csr.reverse()
+        score_v = np.zeros(csr.num_nodes)
+        for trg in trgs:
+            score_v += bfs(indptr, indices, [trg])
+
+        return pruned.top_k(score_u, score_v, self.candidate_limit)
+
+    def greedy(self):
+        if self.lazy:
+            return self.lazy_greedy()
+
+        # successive halving over the candidates, see FamiliartyModel.race
+        candidates = self.greedy_candidates()
+        score = lambda cands, iters, start: self.fm.sigma_optm(cands, iters, start=start)
+        best = self.fm.race(score, len(candidates), self.schedule, chunks=candidates.chunks())
+        return candidates.to_labels(best)
+
+    # CELF style lazy greedy: a gain scored at an earlier budget step is taken
+    # as an upper bound, so only the top of the queue is rescored, until a
+    # candidate scored in the current step stays on top. familiarity isn't
+    # submodular in the added shortcuts and gains can grow, so this is a
+    # heuristic and its picks can differ from the full greedy's. only the
+    # CELF_KEEP candidates with the best first gains are queued, and
+    # candidates pruned for zero gain stay pruned
+    def lazy_greedy(self):
+        # start over on the first call and after the model is reset
+        if self.celf_heap is None or self.fm.graph.number_of_edges() != self.celf_edge_count:
+            self.celf_candidates, gains = self.best_gains(self.greedy_candidates(), self.CELF_KEEP)
+            self.celf_heap = list(zip(-gains, range(len(gains))))
+            heapq.heapify(self.celf_heap)
+
+            self.celf_step = 0
+            self.celf_evaluated = np.zeros(len(gains), dtype=np.int64)
         else:
-            candidates = self.non_edges()
+            self.celf_step += 1
 
-        sigmas = self.fm.sigma_optm(candidates)
+        csr = self.fm.get_csr()
 
-        for i in range(len(sigmas)):
-            if sigmas[i] > best_sigma:
-                best_sigma = sigmas[i]
-                best_shortcut = candidates[i]
+        while self.celf_heap:
+            if self.celf_evaluated[self.celf_heap[0][1]] == self.celf_step:
+                _, i = heapq.heappop(self.celf_heap)
 
-        return best_shortcut
+                # the caller adds the returned shortcut to the graph
+                self.celf_edge_count = self.fm.graph.number_of_edges() + 1
+                u, v = self.celf_candidates[i]
+                return (csr.nodes[u], csr.nodes[v])
 
-    def random(self):
-        if self.restricted:
-            candidates = self.non_edges_between_st()
-        else:
-            candidates = self.non_edges()
-                
-        return random.choice(tuple(candidates))
+            # scoring cost barely depends on how many shortcuts are scored
+            # together, so rescore the stale top of the queue as a batch
+            stale = []
+            while self.celf_heap and len(stale) < self.CELF_BATCH:
+                _, i = heapq.heappop(self.celf_heap)
+                u, v = self.celf_candidates[i]
+                if not self.fm.graph.has_edge(csr.nodes[u], csr.nodes[v]):
+                    stale.append(i)
 
-    def betweenness(self):
-        best_shortcut = None
-        best_betweeness = -1
-        
-        if self.restricted:
-            candidates = self.non_edges_between_st()
-        else:
-            candidates = self.non_edges()
-
-        for shortcut in candidates:
-            # TODO optimise by just calcing the one edge
+            gains = self.fm.shortcut_gains(self.celf_candidates[stale])
+            for i, gain in zip(stale, gains):
+                self.celf_evaluated[i] = self.celf_step
+                heapq.heappush(self.celf_heap, (-gain, i))
 
-            u, v = shortcut
-            temp_graph = self.fm.graph.copy()
-            temp_graph.add_edge(u, v)
-            all_betweeness = nx.edge_betweenness_centrality(temp_graph)
-            if all_betweeness[shortcut] > best_betweeness:
-                best_shortcut = shortcut
-                best_betweeness = all_betweeness[shortcut]
+        return None
 
-        return best_shortcut
+    # the k candidates of a source with the highest gains and those gains,
+    # scored chunk by chunk with a running partial sort
+    def best_gains(self, source, k):
+        best = np.empty((0, 2), dtype=np.int64)
+        best_gains = np.empty(0)
 
-    def closeness(self):
-        best_shortcut = None
-        best_closeness = -1
+        for chunk in source.chunks():
+            if len(chunk) == 0:
+                continue
+            best = np.concatenate((best, chunk))
+            best_gains = np.concatenate((best_gains, self.fm.shortcut_gains(chunk)))
 
-        if self.restricted:
-            candidates = self.non_edges_between_st()
-        else:
-            candidates = self.non_edges()
+            if len(best) > k:
+                keep = np.sort(np.argpartition(-best_gains, k)[:k])
+                best, best_gains = best[keep], best_gains[keep]
 
-        for shortcut in candidates:
-            u, v = shortcut
+        return best, best_gains
 
-            temp_graph = self.fm.graph.copy()
-            temp_graph.add_edge(u, v)
-            all_closeness = nx.closeness_centrality(temp_graph)
+    def random(self):
+        source = self.candidate_source()
+        return source.to_labels(source.sample(self.fm.rng))
 
-            new_closeness = all_closeness[u] + all_closeness[v]
-            if new_closeness > best_closeness:
-                best_closeness = new_closeness
-                best_shortcut = shortcut
+    def betweenness(self):
+        # betweenness each shortcut would have, all from one distance table
+        source = self.candidate_source()
+        table = self.fm.get_distance_table()
 
-        return best_shortcut
+        return source.to_labels(source.best(table.edge_betweenness))
 
-    def degree(self):
-        best_shortcut = None
-        best_deg_sum = -1
-
-        # form in-degree map
-        subset_indeg = {}
-        for node in self.fm.graph.nodes:
-            for s in self.fm.src_set:
-                if (s, node) in self.fm.graph.edges:
-                    subset_indeg[node] = subset_indeg.get(node, 0) + 1
-
-        # form out-degree 
-        subset_outdeg = {}
-        for node in self.fm.graph.nodes:
-            for t in self.fm.trg_set:
-                if (node, t) in self.fm.graph.edges:
-                    subset_outdeg[node] = subset_outdeg.get(node, 0) + 1
+    def closeness(self):
+        source = self.candidate_source()
+        csr = source.csr
 
-        if self.restricted:
-            candidates = self.non_edges_between_st()
+        if self.pivots == None or self.pivots >= csr.num_nodes:
+            table = self.fm.get_distance_table()
+            scorer = table.closeness_after_insertion
         else:
-            candidates = self.non_edges()
+            sources = np.sort(self.fm.rng.choice(csr.num_nodes, self.pivots, replace=False))
+            dist = source_distances(csr, sources)
+            scorer = lambda cands: closeness_after_insertion(dist, sources, csr.num_nodes, cands)
 
-        for shortcut in candidates:
-            u, v = shortcut
-            new_deg_sum = subset_indeg.get(u, -1) + subset_outdeg.get(v, -1)
-            if new_deg_sum > best_deg_sum:
-                best_shortcut = shortcut
-                best_deg_sum = new_deg_sum
+        return source.to_labels(source.best(scorer))
 
-        return best_shortcut
+    def degree(self):
+        source = self.candidate_source()
+        subset_indeg, subset_outdeg = self.subset_degrees(source.csr)
+
+        # nodes with no edges from/to the sets count as -1, and a shortcut
+        # needs a sum above -1 to be picked
+        best = source.best(lambda cands: subset_indeg[cands[:, 0]] + subset_outdeg[cands[:, 1]])
+        if best is None or subset_indeg[best[0]] + subset_outdeg[best[1]] <= -1:
+            return None
+
+        return source.to_labels(best)
+
+    # edges from src_set into each node and from each node into trg_set, as
+    # masked column and row sums of the adjacency
+    def subset_degrees(self, csr):
+        in_src = np.zeros(csr.num_nodes, dtype=bool)
+        in_src[csr.to_index(self.fm.src_set)] = True
+        in_trg = np.zeros(csr.num_nodes, dtype=bool)
+        in_trg[csr.to_index(self.fm.trg_set)] = True
+
+        subset_indeg = np.bincount(csr.dst[in_src[csr.src]], minlength=csr.num_nodes)
+        subset_outdeg = np.bincount(csr.src[in_trg[csr.dst]], minlength=csr.num_nodes)
+
+        return (np.where(subset_indeg > 0, subset_indeg, -1),
+                np.where(subset_outdeg > 0, subset_outdeg, -1))
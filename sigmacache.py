@@ -0,0 +1,69 @@
+import json
+import os
+from collections import OrderedDict
+
+
+# least recently used cache of familiarity results keyed by a hash of the
+# configuration they were computed for. with a path, every new result is also
+# appended to that file as a json line and the file is read back on start,
+# so reruns skip configurations that were already evaluated. on start the
+# file is rewritten with just the kept entries if it holds anything else, so
+# it never grows past the size plus one run's results
+class SigmaCache:
+    DEFAULT_SIZE = 4096
+
+    def __init__(self, size=None, path=None):
+        self.size = self.DEFAULT_SIZE if size == None else size
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        if path is not None and os.path.exists(path):
+            lines = 0
+            with open(path, "r") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by an interrupted run
+                    self.store(entry["key"], entry["value"])
+
+            if lines > len(self.entries):
+                self.compact()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        if key not in self.entries:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.store(key, value)
+
+        if self.path is not None:
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"key": key, "value": value}) + "\n")
+
+    # rewrites the file with the kept entries, oldest first so a reload
+    # restores the lru order. written aside and swapped in, so an
+    # interrupted run leaves the old file
+    def compact(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            for key, value in self.entries.items():
+                f.write(json.dumps({"key": key, "value": value}) + "\n")
+        os.replace(tmp, self.path)
+
+    def store(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
@@ -0,0 +1,85 @@
+import networkx as nx
+import numpy as np
+import familiarity
+from candidates import CandidateSource
+from csrgraph import CSRGraph, bfs
+from familiarity import FamiliartyModel as Fam
+
+PROB = 0.3
+ITERS = 100  # two batches, the second one partial
+
+
+def make_graph():
+    graph = nx.gnp_random_graph(30, 0.08, seed=1, directed=True)
+    return graph, CSRGraph.from_networkx(graph)
+
+# active target count of every sample and candidate by searching each live
+# graph, drawing the candidate coins block by block as the kernels do
+def reference(csr, src, trgs, paths, block, seed):
+    rtn = []
+    for masks, picks, rng in familiarity.chunk_batches(csr, PROB, ITERS, seed):
+        k = len(picks)
+        coins = []
+        for start in range(0, len(paths), block):
+            sizes = [len(path) for path in paths[start:start + block]]
+            draws = rng.random((k, sum(sizes))) > PROB
+            coins += np.split(draws, np.cumsum(sizes)[:-1], axis=1)
+
+        for j in range(k):
+            live_graph = csr.live(masks[j])
+            seed_node = src[int(picks[j] * len(src))]
+            counts = []
+            for path, live in zip(paths, coins):
+                added = path[live[j]]
+                for u, v in added:
+                    live_graph.add_edge(u, v)
+                counts.append(live_graph.reach([seed_node])[trgs].sum())
+                for u, v in added:
+                    live_graph.remove_edge(u, v)
+            rtn.append(counts)
+
+    counts = np.array(rtn)
+    return np.array([counts.sum(axis=0), (counts ** 2).sum(axis=0)])
+
+def test_optm_chunk_over_several_blocks(monkeypatch):
+    monkeypatch.setattr(familiarity, "OPTM_CAND_BLOCK", 7)
+    _, csr = make_graph()
+    src, trgs = np.arange(5), np.arange(20, 30)
+    cands = CandidateSource(csr, np.arange(10), np.arange(15, 30)).array()
+    assert len(cands) > 7
+
+    sigmas = familiarity.optm_chunk(csr, PROB, src, trgs, cands, ITERS, np.random.SeedSequence(0))
+    expected = reference(csr, src, trgs, [cand[None, :] for cand in cands], 7,
+                         np.random.SeedSequence(0))
+    assert np.array_equal(sigmas, expected)
+
+def test_optm_paths_chunk_over_several_blocks(monkeypatch):
+    monkeypatch.setattr(familiarity, "OPTM_CAND_BLOCK", 3)
+    _, csr = make_graph()
+    src, trgs = np.arange(5), np.arange(20, 30)
+    cands = CandidateSource(csr, np.arange(10), np.arange(15, 30)).array()
+
+    # paths missing from none up to three edges
+    rng = np.random.default_rng(0)
+    paths = [cands[rng.choice(len(cands), size, replace=False)] for size in [0, 1, 2, 3, 1, 2, 1, 3] * 2]
+
+    sigmas = familiarity.optm_paths_chunk(csr, PROB, src, trgs, paths, ITERS, np.random.SeedSequence(0))
+    expected = reference(csr, src, trgs, paths, 3, np.random.SeedSequence(0))
+    assert np.array_equal(sigmas, expected)
+
+def test_sigma_optm_over_more_than_a_block():
+    graph = nx.gnp_random_graph(150, 0.02, seed=2, directed=True)
+    model = Fam(graph, set(range(10)), set(range(140, 150)), seed=0, workers=1, bank=True)
+    cands = CandidateSource(model.get_csr()).array()
+    assert len(cands) > familiarity.OPTM_CAND_BLOCK
+
+    sigmas = model.sigma_optm(cands, 64)
+    assert sigmas.shape == (len(cands),)
+
+    # shortcuts out of nodes no source reaches change nothing, so they score
+    # the same banked samples as the graph alone
+    csr = model.get_csr()
+    unreached = ~bfs(csr.indptr, csr.indices, csr.to_index(model.src_set))
+    assert unreached[cands[:, 0]].any()
+    assert np.allclose(sigmas[unreached[cands[:, 0]]], model.sigma_sampled(64))
+    assert (sigmas >= model.sigma_sampled(64) - 1e-9).all()